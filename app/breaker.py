@@ -0,0 +1,205 @@
+import html
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from app.cache import invalidate_dashboard
+from app.metrics import registry
+from app.models import SourceBreaker
+
+logger = logging.getLogger(__name__)
+
+vancouver_tz = pytz.timezone('America/Vancouver')
+
+# Consecutive failures after which a source is skipped
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+# Cool-off before the first probe of a disabled source; doubled after every failed probe, up to the maximum
+BREAKER_COOLOFF_HOURS = float(os.getenv('BREAKER_COOLOFF_HOURS', '12'))
+BREAKER_MAX_COOLOFF_HOURS = float(os.getenv('BREAKER_MAX_COOLOFF_HOURS', '168'))
+# A probe that hasn't reported back after this long is assumed lost, and another one is let through
+PROBE_TIMEOUT = timedelta(minutes=15)
+
+TICKETMASTER_SOURCE = 'service:ticketmaster'
+GEMINI_SOURCE = 'service:gemini'
+FIRECRAWL_SOURCE = 'service:firecrawl'
+
+BREAKER_SKIPS = registry.counter('artist_tracker_breaker_skips_total', 'Calls skipped because the source\'s circuit breaker was open.', ('kind',))
+
+
+class SourceDisabled(Exception):
+    """Raised instead of calling a source whose circuit breaker is open."""
+
+
+def url_source(normalized_url: str) -> str:
+    return f"url:{normalized_url}"
+
+
+def source_label(source: str) -> str:
+    kind, _, name = source.partition(':')
+    return f"{name.capitalize()} API" if kind == 'service' else name
+
+
+def counts_as_outage(status_code: Optional[int]) -> bool:
+    """Whether a failed call with this HTTP status says the source is down, rather than the request being wrong."""
+    return status_code is None or status_code >= 500 or status_code in (401, 402, 403, 408, 429)
+
+
+def cooloff(times_opened: int) -> timedelta:
+    hours = BREAKER_COOLOFF_HOURS * 2 ** max(times_opened - 1, 0)
+    return timedelta(hours=min(hours, BREAKER_MAX_COOLOFF_HOURS))
+
+
+def allow(source: str) -> bool:
+    """True if `source` may be called now. Once the cool-off of an open breaker is over, exactly one
+    caller gets through as a half-open probe; everyone else keeps skipping the source until it reports back."""
+    now = datetime.utcnow()
+    try:
+        # A context of its own: this is called from scrape threads and mid-transaction pipeline workers
+        with app.app_context():
+            breaker = SourceBreaker.query.filter_by(source=source).first()
+            if breaker is None or breaker.state == 'closed':
+                return True
+            if breaker.state == 'open' and breaker.retry_at and breaker.retry_at > now:
+                BREAKER_SKIPS.inc(kind=source.partition(':')[0])
+                return False
+            if breaker.state == 'half_open' and breaker.probe_started_at and breaker.probe_started_at > now - PROBE_TIMEOUT:
+                BREAKER_SKIPS.inc(kind=source.partition(':')[0])
+                return False
+            # Only the caller whose update matches the state it read becomes the probe
+            claimed = SourceBreaker.query.filter_by(
+                id=breaker.id, state=breaker.state, probe_started_at=breaker.probe_started_at,
+            ).update({'state': 'half_open', 'probe_started_at': now})
+            db.session.commit()
+            if claimed:
+                invalidate_dashboard()
+    except Exception as e:
+        # Breakers only save calls; a database problem shouldn't disable sources
+        logger.error(f"Could not read the circuit breaker of {source}: {e}")
+        return True
+    if claimed:
+        logger.info(f"Probing {source_label(source)} after its cool-off")
+    else:
+        BREAKER_SKIPS.inc(kind=source.partition(':')[0])
+    return bool(claimed)
+
+
+def record_success(source: str):
+    """Closes the breaker of `source` and forgets its failures."""
+    try:
+        with app.app_context():
+            breaker = SourceBreaker.query.filter_by(source=source).first()
+            if breaker is None or (breaker.state == 'closed' and not breaker.consecutive_failures):
+                return
+            was_disabled = breaker.state != 'closed'
+            breaker.state = 'closed'
+            breaker.consecutive_failures = 0
+            breaker.times_opened = 0
+            breaker.retry_at = None
+            breaker.probe_started_at = None
+            breaker.alert_pending = False
+            breaker.last_success_at = datetime.utcnow()
+            db.session.commit()
+            invalidate_dashboard()
+    except Exception as e:
+        logger.error(f"Could not record a success for {source}: {e}")
+        return
+    if was_disabled:
+        logger.info(f"{source_label(source)} is working again, re-enabled it")
+
+
+def record_failure(source: str, error: str) -> bool:
+    """Counts a failure of `source` and opens its breaker at the threshold (or when a probe fails).
+
+    Returns True when the source is disabled after this failure (newly, or again after a failed probe):
+    the "source disabled" alert then stands in for the usual error report.
+    """
+    now = datetime.utcnow()
+    try:
+        with app.app_context():
+            breaker = SourceBreaker.query.filter_by(source=source).first()
+            if breaker is None:
+                breaker = SourceBreaker(source=source, state='closed', consecutive_failures=0, times_opened=0)
+                db.session.add(breaker)
+                try:
+                    db.session.flush()
+                except IntegrityError:
+                    # Created concurrently by another thread
+                    db.session.rollback()
+                    breaker = SourceBreaker.query.filter_by(source=source).first()
+            breaker.consecutive_failures = (breaker.consecutive_failures or 0) + 1
+            breaker.last_error = (error or '')[:1000]
+            breaker.last_failure_at = now
+            opened = breaker.state == 'closed' and breaker.consecutive_failures >= BREAKER_FAILURE_THRESHOLD
+            disabled = opened or breaker.state != 'closed'
+            if opened or breaker.state == 'half_open':
+                breaker.times_opened = (breaker.times_opened or 0) + 1
+                breaker.state = 'open'
+                breaker.opened_at = now
+                breaker.retry_at = now + cooloff(breaker.times_opened)
+                breaker.probe_started_at = None
+                # Alert once per outage, not on every failed probe
+                breaker.alert_pending = breaker.alert_pending or opened
+                logger.warning(f"Disabled {source_label(source)} after {breaker.consecutive_failures} consecutive "
+                               f"failures, next attempt after {breaker.retry_at:%Y-%m-%d %H:%M} UTC")
+            db.session.commit()
+            invalidate_dashboard()
+            return disabled
+    except Exception as e:
+        logger.error(f"Could not record a failure for {source}: {e}")
+        return False
+
+
+def _local_time(utc_time: datetime) -> str:
+    return pytz.utc.localize(utc_time).astimezone(vancouver_tz).strftime('%B %d, %I:%M %p')
+
+
+def claim_alerts() -> List[Tuple[str, str]]:
+    """(message, idempotency key) for every source disabled since the last call, each returned only once."""
+    alerts = []
+    for breaker in SourceBreaker.query.filter_by(alert_pending=True).all():
+        claimed = SourceBreaker.query.filter_by(id=breaker.id, alert_pending=True).update({'alert_pending': False})
+        db.session.commit()
+        if not claimed:
+            continue
+        message = (f"🔌 <b>Source disabled:</b> {html.escape(source_label(breaker.source))}\n\n"
+                   f"It failed {breaker.consecutive_failures} times in a row. Last error: "
+                   f"{html.escape(breaker.last_error or 'unknown')}\n\n"
+                   f"It will be skipped until {_local_time(breaker.retry_at)} and then retried once; "
+                   f"while it keeps failing it stays disabled for longer each time.")
+        alerts.append((message, f"breaker:{breaker.source}:{breaker.opened_at:%Y%m%d%H%M%S}"))
+    return alerts
+
+
+def breaker_states() -> List[Dict]:
+    """Sources that are disabled, being probed, or have recently failed, for the dashboard."""
+    breakers = SourceBreaker.query.filter(
+        (SourceBreaker.state != 'closed') | (SourceBreaker.consecutive_failures > 0)
+    ).order_by(SourceBreaker.state.desc(), SourceBreaker.source).all()
+    states = []
+    for breaker in breakers:
+        state = breaker.to_dict()
+        state['label'] = source_label(breaker.source)
+        state['retry_at_local'] = _local_time(breaker.retry_at) if breaker.retry_at else None
+        states.append(state)
+    return states
+
+
+def reset_breaker(breaker_id: int) -> Optional[SourceBreaker]:
+    """Re-enables a source by hand; its next call goes through normally."""
+    breaker = db.session.get(SourceBreaker, breaker_id)
+    if breaker is None:
+        return None
+    breaker.state = 'closed'
+    breaker.consecutive_failures = 0
+    breaker.times_opened = 0
+    breaker.retry_at = None
+    breaker.probe_started_at = None
+    breaker.alert_pending = False
+    db.session.commit()
+    invalidate_dashboard()
+    return breaker
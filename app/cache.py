@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.models import Settings
+
+logger = logging.getLogger(__name__)
+
+# Marker files whose modification time tells each process that cached data changed, for setups where more
+# than one process serves the same data directory (the Flask reloader, a multi-worker WSGI server, a
+# one-off script). main.py itself runs the scheduler and the web server in one process.
+CACHE_VERSION_DIR = Path(os.getenv('CACHE_VERSION_DIR', '/app/data/cache'))
+
+# Started with the process: a restart (new code or templates) makes clients fetch pages again
+_BOOT = time.time_ns()
+
+
+class Version:
+    """Change counter for one kind of cached data, shared by every process using the data directory."""
+
+    def __init__(self, name: str):
+        self.path = CACHE_VERSION_DIR / f"{name}.version"
+        self._local = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        """Marks the data as changed, for this process right away and for the others on their next read."""
+        with self._lock:
+            self._local += 1
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            now = time.time_ns()
+            self.path.touch()
+            os.utime(self.path, ns=(now, now))
+        except OSError as e:
+            logger.warning(f"Could not mark {self.path.name} as changed for other processes: {e}")
+
+    def current(self) -> Tuple[int, int]:
+        try:
+            changed = self.path.stat().st_mtime_ns
+        except OSError:
+            changed = 0
+        return self._local, changed
+
+
+class Snapshot:
+    """Read-only copy of a row's columns: safe to keep between requests and to share between threads,
+    unlike ORM objects, which belong to the session that loaded them."""
+
+    def __init__(self, row):
+        for column in row.__table__.columns:
+            object.__setattr__(self, column.name, getattr(row, column.name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self.__dict__!r})"
+
+    def to_dict(self) -> Dict:
+        return {name: value.isoformat() if isinstance(value, datetime) else value
+                for name, value in self.__dict__.items()}
+
+
+settings_version = Version('settings')
+dashboard_version = Version('dashboard')
+_settings: Optional[Tuple[Tuple[int, int], Snapshot]] = None
+
+
+def cached_settings() -> Snapshot:
+    """The settings row, read from the database only after it was saved (in any process).
+
+    Needs an app context on a cache miss. For changing settings, load the row with Settings.get_settings().
+    """
+    global _settings
+    version = settings_version.current()
+    cached = _settings
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    snapshot = Snapshot(Settings.get_settings())
+    _settings = (version, snapshot)
+    return snapshot
+
+
+def invalidate_settings():
+    settings_version.bump()
+    # The dashboard shows the schedule
+    dashboard_version.bump()
+
+
+def invalidate_dashboard():
+    """Called when artists change and when checks start or finish."""
+    dashboard_version.bump()
+
+
+class ViewCache:
+    """One view model per process, rebuilt when its version changes, or once it expires."""
+
+    def __init__(self, version: Version):
+        self.version = version
+        self._entry = None  # (version, model, etag, built_at, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, build: Callable[[], Tuple[Dict[str, Any], Optional[datetime]]]) -> Tuple[Dict[str, Any], str, datetime]:
+        """Returns (model, etag, built at). `build` returns the model and when it expires (local time), if ever."""
+        version = self.version.current()
+        entry = self._entry
+        if entry is not None and entry[0] == version and (entry[4] is None or datetime.now() < entry[4]):
+            return entry[1], entry[2], entry[3]
+        # One build at a time; requests arriving meanwhile get its result
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == version and (entry[4] is None or datetime.now() < entry[4]):
+                return entry[1], entry[2], entry[3]
+            model, expires_at = build()
+            etag = hashlib.sha1(f"{_BOOT}:{model!r}".encode('utf-8')).hexdigest()
+            if entry is not None and entry[2] == etag:
+                # Invalidated, but nothing shown changed: clients' copies stay current
+                built_at = entry[3]
+            else:
+                built_at = datetime.now(timezone.utc).replace(microsecond=0)
+            self._entry = (version, model, etag, built_at, expires_at)
+            return model, etag, built_at
+
+
+dashboard_cache = ViewCache(dashboard_version)
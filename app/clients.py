@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per host in each pooled session; matches the number of threads that may share it
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '8'))
+GEMINI_MODEL_NAME = 'gemini-2.0-flash-lite'
+
+
+def _fingerprint(key: Optional[str]) -> Optional[str]:
+    # Only a hash of the key is kept alongside the client
+    return hashlib.sha256(key.encode('utf-8')).hexdigest() if key else None
+
+
+class ClientRegistry:
+    """Process-wide cache of configured API clients, rebuilt only when their key changes."""
+
+    def __init__(self):
+        self._clients: Dict[str, Tuple[Optional[str], Any]] = {}
+        # Re-entrant: building a client may fetch another one (e.g. its pooled HTTP session)
+        self._lock = threading.RLock()
+
+    def get(self, name: str, key: Optional[str], build: Callable[[], Any]) -> Any:
+        fingerprint = _fingerprint(key)
+        with self._lock:
+            cached = self._clients.get(name)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            if cached is not None:
+                logger.info(f"Key for {name} changed, rebuilding its client")
+                close = getattr(cached[1], 'close', None)
+                if callable(close):
+                    close()
+            client = build()
+            self._clients[name] = (fingerprint, client)
+            return client
+
+    def clear(self):
+        with self._lock:
+            for _, client in self._clients.values():
+                close = getattr(client, 'close', None)
+                if callable(close):
+                    close()
+            self._clients.clear()
+
+
+registry = ClientRegistry()
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def http_session(name: str) -> requests.Session:
+    """A pooled session per API, so repeated calls reuse TCP/TLS connections."""
+    return registry.get(f"http:{name}", None, lambda: _build_session(HTTP_POOL_SIZE))
+
+
+def gemini_model(api_key: Optional[str]):
+    """The configured Gemini model, or None without a key. google.generativeai is imported on first use."""
+    if not api_key:
+        return None
+
+    def build():
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        logger.info(f"Gemini configured successfully with {GEMINI_MODEL_NAME}.")
+        return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+    return registry.get('gemini', api_key, build)
+
+
+def firecrawl_app(api_key: Optional[str]):
+    """The Firecrawl client, or None without a key. firecrawl is imported on first use."""
+    if not api_key:
+        return None
+
+    def build():
+        from firecrawl import FirecrawlApp
+        logger.info("Firecrawl configured successfully.")
+        return FirecrawlApp(api_key=api_key)
+
+    return registry.get('firecrawl', api_key, build)
@@ -0,0 +1,88 @@
+import os
+import time
+from typing import Optional
+
+from app.metrics import registry
+
+# Wall-clock budget of one artist's check (Ticketmaster, scrapes and LLM extraction together), and of a
+# whole check run. Work left when a deadline passes is skipped and reported as a timeout. 0 disables them.
+ARTIST_DEADLINE_SECONDS = float(os.getenv('ARTIST_DEADLINE_SECONDS', '600'))
+RUN_DEADLINE_SECONDS = float(os.getenv('RUN_DEADLINE_SECONDS', '10800'))
+
+DEADLINE_MISSES = registry.counter('artist_tracker_deadline_misses_total', 'Checks cut short by a deadline.', ('deadline',))
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting a call once the deadline of the work it belongs to has passed."""
+
+
+def _duration(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{seconds / 3600:g} h"
+    if seconds >= 60:
+        return f"{seconds / 60:g} min"
+    return f"{seconds:g}s"
+
+
+class Deadline:
+    """A point in time some work has to be done by, bounded by its parent's (an artist's check by its run's).
+
+    `seconds` of None or 0 means no limit of its own.
+    """
+
+    def __init__(self, seconds: Optional[float], name: str, parent: Optional['Deadline'] = None):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.name = name
+        self.parent = parent
+        self.expires_at = time.monotonic() + self.seconds if self.seconds else None
+        self.missed: Optional[str] = None  # Why work was cut short, once it was
+
+    def describe(self) -> str:
+        return f"the {self.name} deadline ({_duration(self.seconds)})"
+
+    def _expired(self) -> Optional['Deadline']:
+        now = time.monotonic()
+        deadline = self
+        while deadline is not None:
+            if deadline.expires_at is not None and deadline.expires_at <= now:
+                return deadline
+            deadline = deadline.parent
+        return None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before this deadline or one of its parents passes; None without a limit."""
+        now = time.monotonic()
+        left = []
+        deadline = self
+        while deadline is not None:
+            if deadline.expires_at is not None:
+                left.append(deadline.expires_at - now)
+            deadline = deadline.parent
+        return max(min(left), 0.0) if left else None
+
+    def timeout(self, limit: float) -> float:
+        """Timeout for one call: `limit`, or less when the deadline comes sooner."""
+        remaining = self.remaining()
+        return limit if remaining is None else min(limit, remaining)
+
+    def overdue(self, when: str) -> bool:
+        """True once the deadline has passed; the first time, records `when` (e.g. "during scraping") work stopped."""
+        expired = self._expired()
+        if expired is None:
+            return False
+        if self.missed is None:
+            self.missed = f"Stopped at {expired.describe()} {when}"
+            DEADLINE_MISSES.inc(deadline=expired.name)
+            if expired.missed is None:
+                expired.missed = self.missed
+        return True
+
+    def check(self, when: str):
+        """Raises DeadlineExceeded if the deadline has passed."""
+        if self.overdue(when):
+            raise DeadlineExceeded(self.missed)
+
+
+def call_timeout(limit: float, deadline: Optional[Deadline] = None) -> float:
+    """Timeout for one external call made on behalf of work with `deadline` (if any)."""
+    return deadline.timeout(limit) if deadline is not None else limit
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Approximate prompt token budget for one batched LLM request
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', '24000'))
+# Pages whose changed sections add up to more tokens than this are extracted map-reduce style: in chunks of
+# about LLM_MAP_CHUNK_TOKENS, each repeating up to LLM_MAP_OVERLAP_CHARS of the previous chunk's last sections,
+# with up to LLM_MAP_CONCURRENCY chunk requests at a time. Large single prompts come back slow, truncated or
+# with dates missing.
+LLM_MAP_REDUCE_THRESHOLD = int(os.getenv('LLM_MAP_REDUCE_THRESHOLD', '12000'))
+LLM_MAP_CHUNK_TOKENS = int(os.getenv('LLM_MAP_CHUNK_TOKENS', '4000'))
+LLM_MAP_OVERLAP_CHARS = int(os.getenv('LLM_MAP_OVERLAP_CHARS', '3000'))
+LLM_MAP_CONCURRENCY = int(os.getenv('LLM_MAP_CONCURRENCY', '3'))
+# Rough characters-per-token ratio used for budgeting (no tokenizer call needed)
+CHARS_PER_TOKEN = 4
+# Bump when the prompt or schema changes in a way that invalidates previously extracted dates
+EXTRACTION_VERSION = 2
+
+
+class ExtractedTourDate(BaseModel):
+    """One tour date as returned by the LLM. Gemini schemas can't carry defaults, so every field is required."""
+    source_id: int = Field(description="The id of the SOURCE block the date was found in")
+    city: str = Field(description="City including state/province, e.g. 'Los Angeles, CA'")
+    venue: str = Field(description="Venue name")
+    date: str = Field(description="Event date as YYYY-MM-DD")
+    ticket_url: str = Field(description="Ticket link if available, otherwise '#'")
+
+
+class ExtractionResult(BaseModel):
+    """Response schema for structured extraction."""
+    tour_dates: List[ExtractedTourDate]
+
+
+@dataclass
+class ExtractionSource:
+    """A scraped page (or section of one) to extract dates from, with the artist it was scraped for."""
+    source_id: int
+    artist_name: str
+    url: str
+    content: str
+
+
+PROMPT_HEADER = """
+You extract concert or show dates from web pages. Each SOURCE block below contains text scraped from one page
+and the artist it was scraped for.
+
+For each SOURCE, extract every tour date for that SOURCE's artist. Locations are filtered afterwards, so do not
+leave any date out because of where it is.
+
+For every date return source_id (the id of the SOURCE block it came from), city (including the 2-letter
+state/province code for the US and Canada, e.g. "Los Angeles, CA" or "Vancouver, BC", otherwise "City, Country"),
+venue, date (YYYY-MM-DD) and ticket_url (or '#' if not available). Never attribute a date to a different SOURCE.
+If there are no dates, return an empty tour_dates list.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _source_block(source: ExtractionSource) -> str:
+    return (
+        f"=== SOURCE {source.source_id} ===\n"
+        f"Artist: {source.artist_name}\n"
+        f"URL: {source.url}\n"
+        f"```markdown\n{source.content}\n```\n"
+    )
+
+
+def build_prompt(sources: List[ExtractionSource]) -> str:
+    """Builds one prompt covering all `sources`; the shared instructions are only sent once."""
+    return PROMPT_HEADER + "\n" + "\n".join(_source_block(source) for source in sources)
+
+
+def pack_batches(sources: List[ExtractionSource], token_budget: int = LLM_BATCH_TOKEN_BUDGET) -> List[List[ExtractionSource]]:
+    """Greedily packs sources into batches whose prompts stay under `token_budget`.
+
+    A source that is larger than the budget on its own gets a batch to itself.
+    """
+    header_tokens = estimate_tokens(PROMPT_HEADER)
+    batches: List[List[ExtractionSource]] = []
+    current: List[ExtractionSource] = []
+    current_tokens = header_tokens
+    for source in sources:
+        source_tokens = estimate_tokens(_source_block(source))
+        if current and current_tokens + source_tokens > token_budget:
+            batches.append(current)
+            current = []
+            current_tokens = header_tokens
+        current.append(source)
+        current_tokens += source_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def is_large_page(sources: List[ExtractionSource], threshold: int = LLM_MAP_REDUCE_THRESHOLD) -> bool:
+    """Whether one page's sections are too much content for a single extraction request."""
+    return sum(estimate_tokens(source.content) for source in sources) > threshold
+
+
+def split_chunks(sources: List[ExtractionSource], chunk_tokens: int = LLM_MAP_CHUNK_TOKENS,
+                 overlap_chars: int = LLM_MAP_OVERLAP_CHARS) -> List[List[ExtractionSource]]:
+    """Groups one page's sections, in page order, into chunks for map-reduce extraction.
+
+    Chunks break at section boundaries. Each chunk starts with the last sections of the previous one
+    (up to `overlap_chars`), so dates listed across a boundary are seen with their context at least once;
+    merge_results drops the duplicates this produces.
+    """
+    header_tokens = estimate_tokens(PROMPT_HEADER)
+    chunks: List[List[ExtractionSource]] = []
+    current: List[ExtractionSource] = []
+    current_tokens = header_tokens
+    for source in sources:
+        source_tokens = estimate_tokens(_source_block(source))
+        if current and current_tokens + source_tokens > chunk_tokens:
+            chunks.append(current)
+            overlap: List[ExtractionSource] = []
+            overlap_size = 0
+            # Never the whole chunk, so every chunk adds new sections
+            for previous in reversed(current[1:]):
+                overlap_size += len(previous.content)
+                if overlap_size > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+            current = overlap
+            current_tokens = header_tokens + sum(estimate_tokens(_source_block(previous)) for previous in overlap)
+        current.append(source)
+        current_tokens += source_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def merge_results(results: Iterable[Dict[int, List[Dict]]]) -> Dict[int, List[Dict]]:
+    """Reduce step of map-reduce extraction: combines the chunks' {source_id: [dates]}, dropping the repeats
+    of sections extracted by two overlapping chunks (same venue, date and city)."""
+    merged: Dict[int, List[Dict]] = {}
+    seen = set()
+    for result in results:
+        for source_id, dates in result.items():
+            merged.setdefault(source_id, [])
+            for date in dates:
+                key = (source_id, date['venue'].lower(), date['date'], date['city'].lower())
+                if key not in seen:
+                    seen.add(key)
+                    merged[source_id].append(date)
+    return merged
+
+
+@dataclass
+class BatchOutcome:
+    """What one extraction request returned: dates per source, or the error it failed with."""
+    results: Optional[Dict[int, List[Dict]]] = None
+    error: Optional[Exception] = None
+    seconds: float = 0.0
+    prompt_bytes: int = 0
+
+
+def parse_response(text: str, sources: List[ExtractionSource]) -> Dict[int, List[Dict]]:
+    """Parses a structured response into {source_id: [date dicts]}.
+
+    Items are validated one by one, so a single malformed item only drops that item.
+    """
+    results: Dict[int, List[Dict]] = {source.source_id: [] for source in sources}
+    try:
+        items = ExtractionResult.model_validate_json(text).tour_dates
+    except ValidationError as e:
+        logger.warning(f"LLM response did not match the schema, salvaging valid items: {e.error_count()} error(s)")
+        try:
+            raw = json.loads(text)
+        except json.JSONDecodeError:
+            raise ValueError("LLM response is not valid JSON")
+        raw_items = raw.get('tour_dates', []) if isinstance(raw, dict) else raw if isinstance(raw, list) else []
+        items = []
+        for raw_item in raw_items:
+            try:
+                items.append(ExtractedTourDate.model_validate(raw_item))
+            except ValidationError:
+                logger.warning(f"Skipping invalid item in LLM response: {raw_item}")
+
+    for item in items:
+        if item.source_id not in results:
+            logger.warning(f"LLM returned a date for unknown source {item.source_id}, skipping: {item}")
+            continue
+        if not (item.city.strip() and item.venue.strip() and item.date.strip()):
+            logger.warning(f"Skipping incomplete item in LLM response: {item}")
+            continue
+        results[item.source_id].append({
+            'city': item.city.strip(),
+            'venue': item.venue.strip(),
+            'date': item.date.strip(),
+            'ticket_url': item.ticket_url.strip() or '#',
+        })
+    return results
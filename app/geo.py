@@ -0,0 +1,327 @@
+import gzip
+import logging
+import math
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# US and Canadian places from GeoNames (CC BY 4.0), built by scripts/build_gazetteer.py
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'geodata' / 'gazetteer.tsv.gz'
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADIUS_KM = 50
+# Carried over from the old extraction prompt: never report these places, even inside a tracked region
+EXCLUDED_PLACES = {('salmo', 'BC')}
+
+# States, provinces and territories the gazetteer covers, by the names tour pages spell out
+REGION_NAMES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA', 'colorado': 'CO',
+    'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC', 'washington dc': 'DC', 'florida': 'FL',
+    'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL', 'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS',
+    'kentucky': 'KY', 'louisiana': 'LA', 'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI',
+    'minnesota': 'MN', 'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC',
+    'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR', 'pennsylvania': 'PA', 'rhode island': 'RI',
+    'south carolina': 'SC', 'south dakota': 'SD', 'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT',
+    'virginia': 'VA', 'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+    'alberta': 'AB', 'british columbia': 'BC', 'manitoba': 'MB', 'new brunswick': 'NB',
+    'newfoundland and labrador': 'NL', 'newfoundland': 'NL', 'northwest territories': 'NT', 'nova scotia': 'NS',
+    'nunavut': 'NU', 'ontario': 'ON', 'prince edward island': 'PE', 'quebec': 'QC', 'saskatchewan': 'SK',
+    'yukon': 'YT',
+}
+REGION_CODES = set(REGION_NAMES.values())
+CANADIAN_REGIONS = {'AB', 'BC', 'MB', 'NB', 'NL', 'NS', 'NT', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT'}
+# Country qualifiers as tour pages write them, by ISO code (Ticketmaster's countryCode). Others are kept as written
+COUNTRY_NAMES = {
+    'us': 'US', 'usa': 'US', 'u s': 'US', 'u s a': 'US', 'united states': 'US', 'united states of america': 'US',
+    'america': 'US', 'can': 'CA', 'canada': 'CA',
+    'uk': 'GB', 'gb': 'GB', 'united kingdom': 'GB', 'great britain': 'GB', 'england': 'GB', 'scotland': 'GB',
+    'wales': 'GB', 'northern ireland': 'GB', 'ireland': 'IE', 'france': 'FR', 'germany': 'DE', 'spain': 'ES',
+    'portugal': 'PT', 'italy': 'IT', 'netherlands': 'NL', 'the netherlands': 'NL', 'holland': 'NL', 'belgium': 'BE',
+    'luxembourg': 'LU', 'switzerland': 'CH', 'austria': 'AT', 'denmark': 'DK', 'sweden': 'SE', 'norway': 'NO',
+    'finland': 'FI', 'iceland': 'IS', 'poland': 'PL', 'czech republic': 'CZ', 'czechia': 'CZ', 'hungary': 'HU',
+    'greece': 'GR', 'turkey': 'TR', 'mexico': 'MX', 'brazil': 'BR', 'argentina': 'AR', 'chile': 'CL',
+    'colombia': 'CO', 'peru': 'PE', 'japan': 'JP', 'south korea': 'KR', 'korea': 'KR', 'china': 'CN',
+    'taiwan': 'TW', 'hong kong': 'HK', 'singapore': 'SG', 'philippines': 'PH', 'indonesia': 'ID', 'thailand': 'TH',
+    'india': 'IN', 'australia': 'AU', 'new zealand': 'NZ', 'south africa': 'ZA', 'israel': 'IL',
+    'united arab emirates': 'AE', 'uae': 'AE',
+}
+HOME_COUNTRIES = {'US', 'CA'}
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country: str
+    region: str
+    latitude: float
+    longitude: float
+    population: int
+
+
+@dataclass(frozen=True)
+class CityName:
+    """A city as written on a tour page or in Artist.cities, split into its name and qualifiers.
+
+    `region` is a US/Canadian state or province code. `country` is an ISO code when known ('GB' for
+    'London, England'), otherwise the normalized qualifier ('reykjavik, iceland' keeps 'iceland').
+    """
+    name: str
+    region: Optional[str] = None
+    country: Optional[str] = None
+
+    @property
+    def foreign(self) -> bool:
+        """Qualified by a country outside the gazetteer's coverage."""
+        return self.country is not None and self.country not in HOME_COUNTRIES
+
+    @property
+    def qualifier(self) -> Optional[str]:
+        return self.region or self.country
+
+
+@dataclass(frozen=True)
+class TrackedLocation:
+    """A location from Artist.cities: a region code ('BC'), or a city, resolved to a place when it is
+    qualified with a state/province the gazetteer knows it in."""
+    label: str
+    region: Optional[str] = None
+    place: Optional[Place] = None
+    city: Optional[CityName] = None
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase ASCII form of a place name, so 'Montréal' and 'montreal' compare equal."""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(ascii_name.replace('.', ' ').replace('-', ' ').lower().split())
+
+
+def _country_code(qualifier: str) -> str:
+    name = normalize_name(qualifier)
+    if name in COUNTRY_NAMES:
+        return COUNTRY_NAMES[name]
+    return qualifier.upper() if len(qualifier) == 2 and qualifier.isalpha() else name
+
+
+def split_city(city: str) -> Optional[CityName]:
+    """Splits 'City', 'City, ST', 'City, State', 'City, ST, Country' or 'City, Country'. None if blank.
+
+    A 2-letter qualifier is read as a US/Canadian state or province when it is one, so 'Paris, CA' is
+    in California, and as a country otherwise ('London, UK').
+    """
+    parts = [part.strip() for part in (city or '').split(',') if part.strip()]
+    if not parts:
+        return None
+    region = country = None
+    for qualifier in parts[1:]:
+        code = qualifier.upper() if qualifier.upper() in REGION_CODES else REGION_NAMES.get(normalize_name(qualifier))
+        if region is None and country is None and code:
+            region = code
+        elif country is None:
+            country = _country_code(qualifier)
+    if region and country is None:
+        country = 'CA' if region in CANADIAN_REGIONS else 'US'
+    return CityName(parts[0], region, country)
+
+
+def split_tracked(location: str) -> Optional[CityName]:
+    """Like split_city, but also takes the qualifier after a space ('Vancouver BC', 'London UK'), since
+    Artist.cities is itself comma-separated. Only upper-case codes are read that way."""
+    if ',' not in location:
+        name, _, last = location.strip().rpartition(' ')
+        if name and last.isupper() and (last in REGION_CODES or normalize_name(last) in COUNTRY_NAMES):
+            return split_city(f"{name}, {last}")
+    return split_city(location)
+
+
+def _to_xyz(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _chord_for_km(radius_km: float) -> float:
+    # Straight-line distance on the unit sphere matching a great-circle distance
+    return 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def distance_km(a: Place, b: Place) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a.latitude, a.longitude, b.latitude, b.longitude))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class KDTree:
+    """Static 3-d tree over points on the unit sphere, for radius queries around a place."""
+
+    def __init__(self, points: List[Tuple[float, float, float]]):
+        self.points = points
+        # Nodes as flat lists: index of the point, split axis, left child, right child (-1 for none)
+        self.nodes: List[List[int]] = []
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        node = len(self.nodes)
+        self.nodes.append([indices[middle], axis, -1, -1])
+        self.nodes[node][2] = self._build(indices[:middle], depth + 1)
+        self.nodes[node][3] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def query_radius(self, center: Tuple[float, float, float], radius: float) -> List[int]:
+        """Indices of the points within straight-line `radius` of `center`."""
+        found = []
+        radius_sq = radius * radius
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index, axis, left, right = self.nodes[node]
+            point = self.points[index]
+            if sum((p - c) ** 2 for p, c in zip(point, center)) <= radius_sq:
+                found.append(index)
+            diff = center[axis] - point[axis]
+            stack.append(left if diff <= 0 else right)
+            if abs(diff) <= radius:
+                stack.append(right if diff <= 0 else left)
+        return found
+
+
+class Gazetteer:
+    """Offline place lookup by name and by distance."""
+
+    def __init__(self, places: List[Place]):
+        self.places = places
+        self.by_name: Dict[str, List[Place]] = {}
+        for place in places:
+            self.by_name.setdefault(normalize_name(place.name), []).append(place)
+        for candidates in self.by_name.values():
+            candidates.sort(key=lambda p: -p.population)
+        self.regions = {place.region for place in places}
+        self.tree = KDTree([_to_xyz(p.latitude, p.longitude) for p in places])
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_PATH) -> 'Gazetteer':
+        places = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                name, country, region, lat, lon, population = line.rstrip('\n').split('\t')
+                places.append(Place(name, country, region, float(lat), float(lon), int(population)))
+        return cls(places)
+
+    def lookup(self, name: str, region: Optional[str] = None) -> Optional[Place]:
+        """The most populous place called `name` (in `region` when given)."""
+        candidates = self.by_name.get(normalize_name(name), [])
+        if region:
+            candidates = [p for p in candidates if p.region == region.upper()]
+        return candidates[0] if candidates else None
+
+    def lookup_city(self, city: CityName) -> Optional[Place]:
+        """The place a qualified US/Canadian city refers to. Bare names aren't resolved: 'London' or
+        'Berlin' would otherwise become London, ON and Berlin, NH."""
+        if city.region is None or city.foreign:
+            return None
+        return self.lookup(city.name, city.region)
+
+    def near(self, place: Place, radius_km: float) -> List[Place]:
+        indices = self.tree.query_radius(_to_xyz(place.latitude, place.longitude), _chord_for_km(radius_km))
+        return [self.places[i] for i in indices]
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Loads the bundled gazetteer once per process. Returns None if it can't be read."""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            try:
+                _gazetteer = Gazetteer.load()
+                logger.info(f"Loaded gazetteer with {len(_gazetteer.places)} places")
+            except Exception as e:
+                logger.error(f"Could not load gazetteer from {GAZETTEER_PATH}: {e}")
+                return None
+        return _gazetteer
+
+
+class LocationMatcher:
+    """Decides locally whether a venue city matches an artist's tracked locations.
+
+    A city matches when it lies in a tracked state/province, or within `radius_km` of a tracked city
+    qualified with its state/province ('Vancouver BC'). Other tracked cities (bare names, cities abroad,
+    places missing from the gazetteer) match cities of the same name and, if they have one, qualifier.
+    """
+
+    def __init__(self, locations: List[str], radius_km: float = DEFAULT_RADIUS_KM):
+        self.radius_km = radius_km
+        self.gazetteer = get_gazetteer()
+        self.tracked: List[TrackedLocation] = []
+        for location in locations:
+            location = location.strip()
+            if not location:
+                continue
+            if len(location) == 2 and location.isalpha():
+                self.tracked.append(TrackedLocation(label=location, region=location.upper()))
+                continue
+            city = split_tracked(location)
+            place = self.gazetteer.lookup_city(city) if self.gazetteer else None
+            if place is None and city.region and not city.foreign:
+                logger.warning(f"'{location}' is not in the gazetteer, matching it by name only")
+            self.tracked.append(TrackedLocation(label=location, place=place, city=city))
+        self.regions = {t.region for t in self.tracked if t.region}
+        # Cities without a radius: normalized name -> their qualifiers (None for a bare name)
+        self.names: Dict[str, set] = {}
+        for tracked in self.tracked:
+            if tracked.city and not tracked.place:
+                self.names.setdefault(normalize_name(tracked.city.name), set()).add(tracked.city.qualifier)
+        self._nearby = set()
+        if self.gazetteer:
+            for tracked in self.tracked:
+                if tracked.place:
+                    self._nearby.update(self.gazetteer.near(tracked.place, radius_km))
+
+    def matches(self, city: str) -> bool:
+        venue = split_city(city)
+        if venue is None:
+            return False
+        if (normalize_name(venue.name), venue.region) in EXCLUDED_PLACES:
+            return False
+        if not venue.foreign:
+            if venue.region and venue.region in self.regions:
+                return True
+            # Venue cities are resolved by name alone too: tour pages often leave out the state
+            place = self.gazetteer.lookup(venue.name, venue.region) if self.gazetteer else None
+            if place is not None and (place.region in self.regions or place in self._nearby):
+                return True
+        qualifiers = self.names.get(normalize_name(venue.name))
+        if qualifiers is None:
+            return False
+        if None in qualifiers:
+            return True
+        if venue.qualifier is None:
+            # Venues abroad are written with their country, so a bare venue city is in the US or Canada
+            return any(q in REGION_CODES or q in HOME_COUNTRIES for q in qualifiers)
+        # 'London UK' matches 'London, England' and 'London, UK'
+        return venue.region in qualifiers or venue.country in qualifiers
+
+    def search_centers(self) -> List[TrackedLocation]:
+        """Resolved cities to search around, skipping ones already inside the radius of a larger tracked city."""
+        centers: List[TrackedLocation] = []
+        resolved = sorted((t for t in self.tracked if t.place), key=lambda t: -t.place.population)
+        for tracked in resolved:
+            if any(distance_km(tracked.place, center.place) <= self.radius_km for center in centers):
+                logger.debug(f"{tracked.label} is covered by the radius search around another tracked city")
+                continue
+            centers.append(tracked)
+        return centers
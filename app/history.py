@@ -0,0 +1,231 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from sqlalchemy import func
+
+from app import db
+from app.cache import invalidate_dashboard
+from app.models import ArtistCheck, CheckRun
+
+vancouver_tz = pytz.timezone('America/Vancouver')
+
+# Runs interrupted longer ago than this aren't resumed on startup; the next scheduled run covers their artists
+RESUME_MAX_AGE_HOURS = float(os.getenv('RESUME_MAX_AGE_HOURS', '24'))
+
+
+def _now() -> datetime:
+    """Naive Vancouver local time, matching how Artist.last_checked is stored."""
+    return datetime.now(vancouver_tz).replace(tzinfo=None)
+
+
+def start_run(trigger: str = 'scheduled') -> CheckRun:
+    """Creates and persists a new CheckRun in the 'running' state."""
+    run = CheckRun(trigger=trigger, status='running', started_at=_now())
+    db.session.add(run)
+    db.session.commit()
+    invalidate_dashboard()
+    return run
+
+
+def finish_run(run: CheckRun, status: str = 'completed'):
+    """Marks a run as finished and rolls up totals from its artist checks."""
+    run.finished_at = _now()
+    run.duration_seconds = (run.finished_at - run.started_at).total_seconds() if run.started_at else None
+    run.status = status
+    # Aggregate in SQL: artist checks may have been written by pipeline workers in other sessions
+    checked, dates_found, errors = db.session.query(
+        func.count(ArtistCheck.id), func.sum(ArtistCheck.dates_found), func.sum(ArtistCheck.errors)
+    ).filter(ArtistCheck.run_id == run.id).one()
+    run.artists_checked = checked or 0
+    run.dates_found = dates_found or 0
+    run.errors = errors or 0
+    run.timeouts = ArtistCheck.query.filter_by(run_id=run.id, status='timeout').count()
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_dashboard()
+
+
+def start_artist_check(run: CheckRun, artist) -> ArtistCheck:
+    """Creates the per-artist record for `artist` (an Artist or anything with id and name) within `run`."""
+    check = ArtistCheck(run=run, artist_id=artist.id, artist_name=artist.name,
+                        status='running', started_at=_now())
+    db.session.add(check)
+    db.session.commit()
+    return check
+
+
+def finish_artist_check(check: ArtistCheck, status: str = 'completed', error_message: Optional[str] = None):
+    """Marks a per-artist record as finished. Counts are filled in by TourScraper.check_artist."""
+    check.finished_at = _now()
+    check.duration_seconds = (check.finished_at - check.started_at).total_seconds() if check.started_at else None
+    check.status = status
+    if error_message:
+        check.error_message = error_message
+        check.errors = max(check.errors or 0, 1)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Artist.last_checked and the run time panel change with every finished check
+    invalidate_dashboard()
+
+
+def checkpoint_artist_check(check_id: int):
+    """Marks an artist's check as fully done (results saved, notifications queued), so a resumed run skips it."""
+    ArtistCheck.query.filter_by(id=check_id).update({'checkpointed_at': _now()})
+    db.session.commit()
+
+
+def interrupt_run(run: CheckRun):
+    """Leaves a run unfinished on shutdown; it is resumed when the app starts again."""
+    run.status = 'interrupted'
+    db.session.commit()
+    invalidate_dashboard()
+
+
+def run_to_resume() -> Optional[Tuple[CheckRun, List[int]]]:
+    """Finds the run a restart interrupted, and the ids of the artists it still has to check, in planned order.
+
+    Only the latest run is resumed, and only if it started recently. Older unfinished runs and
+    single-artist checks are closed as interrupted instead.
+    """
+    unfinished = CheckRun.query.filter(CheckRun.status.in_(('running', 'interrupted'))).order_by(CheckRun.id).all()
+    if not unfinished:
+        return None
+    latest_id = db.session.query(func.max(CheckRun.id)).scalar()
+    resumable = None
+    for run in unfinished:
+        if (run.id == latest_id and run.trigger != 'manual_artist' and run.artist_ids and run.started_at
+                and _now() - run.started_at < timedelta(hours=RESUME_MAX_AGE_HOURS)):
+            resumable = run
+            continue
+        ArtistCheck.query.filter_by(run_id=run.id, status='running').update({'status': 'interrupted'})
+        finish_run(run, 'interrupted')
+    if resumable is None:
+        return None
+
+    done = {artist_id for (artist_id,) in db.session.query(ArtistCheck.artist_id).filter(
+        ArtistCheck.run_id == resumable.id, ArtistCheck.checkpointed_at.isnot(None))}
+    # Checks that were queued or in flight when the process stopped are redone from scratch
+    ArtistCheck.query.filter(ArtistCheck.run_id == resumable.id, ArtistCheck.checkpointed_at.is_(None)).delete()
+    resumable.status = 'running'
+    resumable.resume_count = (resumable.resume_count or 0) + 1
+    db.session.commit()
+    invalidate_dashboard()
+    return resumable, [artist_id for artist_id in json.loads(resumable.artist_ids) if artist_id not in done]
+
+
+class CheckStats:
+    """In-memory counterpart of ArtistCheck, filled in while a check moves between pipeline threads.
+
+    ORM objects are bound to the session of the thread that loaded them, so workers write to this
+    instead and the single database-writing stage copies it onto the ArtistCheck row.
+    """
+    FIELDS = ('ticketmaster_seconds', 'scrape_seconds', 'llm_seconds', 'llm_bytes_sent', 'dates_found', 'errors')
+
+    def __init__(self):
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+        self.sources: List[Dict] = []
+
+    def add_source_timing(self, **timing):
+        self.sources.append(timing)
+
+    def apply_to(self, check: ArtistCheck):
+        for name in self.FIELDS:
+            setattr(check, name, getattr(self, name))
+        check.source_timings = json.dumps(self.sources)
+
+
+@contextmanager
+def stage_timer(record: Optional[ArtistCheck], field: str):
+    """Adds the elapsed time of the block to `record.<field>` (no-op without a record)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if record is not None:
+            setattr(record, field, (getattr(record, field) or 0.0) + time.perf_counter() - start)
+
+
+def recent_runs(limit: int = 20) -> List[CheckRun]:
+    return CheckRun.query.order_by(CheckRun.id.desc()).limit(limit).all()
+
+
+def run_time_breakdown(days: int = 28) -> Dict:
+    """Aggregates the last `days` of checks per artist, per URL and per week.
+
+    Used to find which artists or URLs dominate run time and to spot regressions.
+    """
+    since = _now() - timedelta(days=days)
+    checks = ArtistCheck.query.filter(ArtistCheck.started_at >= since,
+                                      ArtistCheck.status != 'running').all()
+
+    per_artist = defaultdict(lambda: {'checks': 0, 'total_seconds': 0.0, 'ticketmaster_seconds': 0.0,
+                                      'scrape_seconds': 0.0, 'llm_seconds': 0.0, 'llm_bytes_sent': 0,
+                                      'dates_found': 0, 'errors': 0})
+    per_url = defaultdict(lambda: {'checks': 0, 'scrape_seconds': 0.0, 'llm_seconds': 0.0,
+                                   'llm_bytes_sent': 0, 'errors': 0})
+    for check in checks:
+        stats = per_artist[check.artist_name]
+        stats['checks'] += 1
+        stats['total_seconds'] += check.duration_seconds or 0.0
+        stats['ticketmaster_seconds'] += check.ticketmaster_seconds or 0.0
+        stats['scrape_seconds'] += check.scrape_seconds or 0.0
+        stats['llm_seconds'] += check.llm_seconds or 0.0
+        stats['llm_bytes_sent'] += check.llm_bytes_sent or 0
+        stats['dates_found'] += check.dates_found or 0
+        stats['errors'] += check.errors or 0
+        for timing in check.get_source_timings():
+            url_stats = per_url[timing.get('url')]
+            url_stats['checks'] += 1
+            url_stats['scrape_seconds'] += timing.get('scrape_seconds') or 0.0
+            url_stats['llm_seconds'] += timing.get('llm_seconds') or 0.0
+            url_stats['llm_bytes_sent'] += timing.get('llm_bytes_sent') or 0
+            url_stats['errors'] += 1 if timing.get('error') else 0
+
+    artists = []
+    for name, stats in per_artist.items():
+        stats['artist_name'] = name
+        stats['avg_seconds'] = stats['total_seconds'] / stats['checks'] if stats['checks'] else 0.0
+        artists.append(stats)
+    artists.sort(key=lambda s: s['total_seconds'], reverse=True)
+
+    urls = []
+    for url, stats in per_url.items():
+        stats['url'] = url
+        stats['total_seconds'] = stats['scrape_seconds'] + stats['llm_seconds']
+        stats['avg_seconds'] = stats['total_seconds'] / stats['checks'] if stats['checks'] else 0.0
+        urls.append(stats)
+    urls.sort(key=lambda s: s['total_seconds'], reverse=True)
+
+    # Weekly trend of full runs, for tracking regressions over time
+    runs = CheckRun.query.filter(CheckRun.started_at >= since, CheckRun.status != 'running').all()
+    weeks = defaultdict(lambda: {'runs': 0, 'total_seconds': 0.0, 'artists_checked': 0})
+    for run in runs:
+        year, week, _ = run.started_at.isocalendar()
+        bucket = weeks[f"{year}-W{week:02d}"]
+        bucket['runs'] += 1
+        bucket['total_seconds'] += run.duration_seconds or 0.0
+        bucket['artists_checked'] += run.artists_checked or 0
+    weekly = []
+    for label in sorted(weeks):
+        bucket = weeks[label]
+        weekly.append({
+            'week': label,
+            'runs': bucket['runs'],
+            'avg_run_seconds': bucket['total_seconds'] / bucket['runs'] if bucket['runs'] else 0.0,
+            'avg_seconds_per_artist': bucket['total_seconds'] / bucket['artists_checked'] if bucket['artists_checked'] else 0.0,
+        })
+
+    return {'days': days, 'artists': artists, 'urls': urls, 'weekly': weekly}
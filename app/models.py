@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+import json
 
 class Artist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,6 +18,12 @@ class Settings(db.Model):
     telegram_chat_id = db.Column(db.String(100))
     openai_api_key = db.Column(db.String(100))
     check_frequency = db.Column(db.String(100), default="09:00,21:00")
+    profiling_enabled = db.Column(db.Boolean, default=False)  # Save a cProfile profile for every check
+    profile_retention = db.Column(db.Integer, default=20)  # Number of saved profiles to keep
+    match_radius_km = db.Column(db.Integer, default=50)  # Venues this close to a tracked city count as a match
+    ticketmaster_daily_budget = db.Column(db.Integer, default=5000)  # Discovery API calls per day (the default quota)
+    firecrawl_daily_budget = db.Column(db.Integer)  # Scrapes per day, empty for no limit
+    gemini_daily_token_budget = db.Column(db.Integer)  # Gemini tokens per day, empty for no limit
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
 
     @staticmethod
@@ -26,4 +33,184 @@ class Settings(db.Model):
             settings = Settings()
             db.session.add(settings)
             db.session.commit()
-        return settings
\ No newline at end of file
+        return settings
+
+class CheckRun(db.Model):
+    """One execution of a check (scheduled run, Check All or a single manual check)."""
+    id = db.Column(db.Integer, primary_key=True)
+    trigger = db.Column(db.String(20), default='scheduled')  # 'scheduled', 'manual' or 'manual_artist'
+    status = db.Column(db.String(20), default='running')  # 'running', 'completed', 'failed', 'interrupted' or 'timeout'
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+    artist_ids = db.Column(db.Text)  # JSON list of the artists planned for the run, in order; used to resume it
+    resume_count = db.Column(db.Integer, default=0)  # Times the run was resumed after a restart
+    prefetch_seconds = db.Column(db.Float)  # Time spent in the run-wide scrape stage
+    artists_checked = db.Column(db.Integer, default=0)
+    dates_found = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Integer, default=0)
+    artists_deferred = db.Column(db.Integer, default=0)  # Left for a later run to stay within the API budgets
+    timeouts = db.Column(db.Integer, default=0)  # Artist checks cut short (or never started) by a deadline
+    artist_checks = db.relationship('ArtistCheck', backref='run', lazy=True,
+                                    cascade='all, delete-orphan', order_by='ArtistCheck.id')
+
+    def to_dict(self, include_checks=False):
+        data = {
+            'id': self.id,
+            'trigger': self.trigger,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration_seconds,
+            'prefetch_seconds': self.prefetch_seconds,
+            'artists_checked': self.artists_checked,
+            'dates_found': self.dates_found,
+            'errors': self.errors,
+            'artists_deferred': self.artists_deferred,
+            'timeouts': self.timeouts,
+            'resume_count': self.resume_count,
+        }
+        if include_checks:
+            data['artist_checks'] = [check.to_dict() for check in self.artist_checks]
+        return data
+
+class ArtistCheck(db.Model):
+    """Per-artist record of a check, with a timing breakdown per stage and source."""
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('check_run.id'), nullable=False, index=True)
+    artist_id = db.Column(db.Integer, index=True)  # Not a foreign key so history survives artist deletion
+    artist_name = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='running')
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    duration_seconds = db.Column(db.Float)
+    ticketmaster_seconds = db.Column(db.Float, default=0.0)
+    scrape_seconds = db.Column(db.Float, default=0.0)
+    llm_seconds = db.Column(db.Float, default=0.0)
+    dates_found = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Integer, default=0)
+    llm_bytes_sent = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)
+    source_timings = db.Column(db.Text)  # JSON list of per-URL timings
+    checkpointed_at = db.Column(db.DateTime)  # Results recorded and notifications queued; a resumed run skips the artist
+
+    def add_source_timing(self, **timing):
+        timings = json.loads(self.source_timings or '[]')
+        timings.append(timing)
+        self.source_timings = json.dumps(timings)
+
+    def get_source_timings(self):
+        return json.loads(self.source_timings or '[]')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'artist_id': self.artist_id,
+            'artist_name': self.artist_name,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_seconds': self.duration_seconds,
+            'ticketmaster_seconds': self.ticketmaster_seconds,
+            'scrape_seconds': self.scrape_seconds,
+            'llm_seconds': self.llm_seconds,
+            'dates_found': self.dates_found,
+            'errors': self.errors,
+            'llm_bytes_sent': self.llm_bytes_sent,
+            'error_message': self.error_message,
+            'sources': self.get_source_timings(),
+        }
+
+class PageSnapshot(db.Model):
+    """Last scraped markdown of an artist URL (zlib-compressed) and the dates extracted per section."""
+    __table_args__ = (db.UniqueConstraint('artist_id', 'url', name='uq_page_snapshot_artist_url'),)
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, nullable=False, index=True)
+    url = db.Column(db.String(500), nullable=False)
+    context_key = db.Column(db.String(40))  # Hash of locations + extraction version the dates were extracted for
+    content = db.Column(db.LargeBinary)
+    section_dates = db.Column(db.Text)  # JSON {section hash: [dates]}
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OutboxMessage(db.Model):
+    """A Telegram message waiting to be (or already) delivered by the background sender."""
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'sending', 'sent' or 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    telegram_message_id = db.Column(db.Integer)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'idempotency_key': self.idempotency_key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+class TicketmasterSync(db.Model):
+    """Sync watermark for one Ticketmaster query (keyword + location + classification)."""
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(300), unique=True, nullable=False)
+    horizon = db.Column(db.DateTime)  # Latest event start (UTC) seen
+    last_full_sync_at = db.Column(db.DateTime)
+    last_sync_at = db.Column(db.DateTime)  # Incremental syncs ask for events going on sale since then
+    event_count = db.Column(db.Integer, default=0)
+
+class TicketmasterEvent(db.Model):
+    """An upcoming event returned for a Ticketmaster query, kept between syncs."""
+    __table_args__ = (db.UniqueConstraint('query_key', 'event_id', name='uq_ticketmaster_event_query'),)
+    id = db.Column(db.Integer, primary_key=True)
+    query_key = db.Column(db.String(300), nullable=False, index=True)
+    event_id = db.Column(db.String(100), nullable=False)
+    local_date = db.Column(db.String(10))  # YYYY-MM-DD, used to expire past events
+    data = db.Column(db.Text)  # JSON of the fields needed to match and report the event
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ApiUsage(db.Model):
+    """Calls (and, for Gemini, tokens) made to an external API on one UTC day."""
+    __table_args__ = (db.UniqueConstraint('service', 'day', name='uq_api_usage_service_day'),)
+    id = db.Column(db.Integer, primary_key=True)
+    service = db.Column(db.String(30), nullable=False)  # 'ticketmaster', 'firecrawl' or 'gemini'
+    day = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD in UTC, when the providers reset their quotas
+    calls = db.Column(db.Integer, default=0)
+    tokens = db.Column(db.Integer, default=0)
+
+class SourceBreaker(db.Model):
+    """Circuit breaker for one source (an artist URL or an external API), skipping it while it keeps failing."""
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(600), unique=True, nullable=False)  # 'url:<normalized url>' or 'service:<name>'
+    state = db.Column(db.String(20), default='closed')  # 'closed', 'open' or 'half_open'
+    consecutive_failures = db.Column(db.Integer, default=0)
+    times_opened = db.Column(db.Integer, default=0)  # Openings since the last success; doubles the cool-off each time
+    opened_at = db.Column(db.DateTime)
+    retry_at = db.Column(db.DateTime)  # When an open breaker lets a probe call through (UTC)
+    probe_started_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    last_failure_at = db.Column(db.DateTime)
+    last_success_at = db.Column(db.DateTime)
+    alert_pending = db.Column(db.Boolean, default=False)  # "Source disabled" alert not yet queued
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source': self.source,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'times_opened': self.times_opened,
+            'opened_at': self.opened_at.isoformat() if self.opened_at else None,
+            'retry_at': self.retry_at.isoformat() if self.retry_at else None,
+            'last_error': self.last_error,
+            'last_failure_at': self.last_failure_at.isoformat() if self.last_failure_at else None,
+            'last_success_at': self.last_success_at.isoformat() if self.last_success_at else None,
+        }
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from app.metrics import registry
+from app.models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two messages; Telegram allows about one message per second per chat
+TELEGRAM_MIN_INTERVAL = float(os.getenv('TELEGRAM_MIN_INTERVAL', '1.0'))
+# Attempts before a message is given up on and marked 'failed'
+TELEGRAM_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', '8'))
+# Exponential backoff between attempts: 5s, 10s, 20s, ... capped at 15 minutes
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+# How often the sender looks for due messages when it isn't woken up by a new one
+POLL_SECONDS = 5
+# Delivered messages are kept this long for inspection, then deleted
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '30'))
+
+OUTBOX_MESSAGES = registry.gauge('artist_tracker_outbox_messages', 'Telegram outbox messages by status.', ('status',))
+
+# Set when a message is enqueued so the sender doesn't wait for its next poll
+_wake = threading.Event()
+
+
+def enqueue_message(text: str, key: Optional[str] = None) -> OutboxMessage:
+    """Stores a message for delivery and returns immediately.
+
+    Enqueueing a `key` that is already in the outbox is a no-op, so a check that is retried
+    or resumed doesn't notify twice. Without a key the message is always enqueued.
+    """
+    key = key or uuid.uuid4().hex
+    existing = OutboxMessage.query.filter_by(idempotency_key=key).first()
+    if existing:
+        logger.info(f"Message {key} is already in the outbox ({existing.status}), not enqueueing again")
+        return existing
+
+    message = OutboxMessage(idempotency_key=key, text=text, status='pending', next_attempt_at=datetime.utcnow())
+    db.session.add(message)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Enqueued concurrently by another thread
+        db.session.rollback()
+        return OutboxMessage.query.filter_by(idempotency_key=key).first()
+    _wake.set()
+    return message
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def outbox_stats() -> Dict:
+    """Message counts per status and the most recent failures."""
+    counts = dict(db.session.query(OutboxMessage.status, func.count(OutboxMessage.id))
+                  .group_by(OutboxMessage.status).all())
+    failed = OutboxMessage.query.filter_by(status='failed').order_by(OutboxMessage.id.desc()).limit(10).all()
+    return {
+        'counts': {status: counts.get(status, 0) for status in ('pending', 'sending', 'sent', 'failed')},
+        'recent_failures': [message.to_dict() for message in failed],
+    }
+
+
+class OutboxSender:
+    """Background thread delivering outbox messages in order, with rate limiting and retries.
+
+    `deliver(text)` performs one send attempt and returns a dict with 'ok', and on failure
+    'error', 'retry_after' (seconds Telegram asked us to wait) and 'permanent'.
+    """
+
+    def __init__(self, deliver: Callable[[str], Dict]):
+        self.deliver = deliver
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sent = 0.0
+        self._paused_until = 0.0
+        self._last_prune = 0.0
+
+    def start(self):
+        with app.app_context():
+            # Messages that were mid-delivery when the process died are retried (at-least-once delivery)
+            recovered = OutboxMessage.query.filter_by(status='sending').update({'status': 'pending'})
+            db.session.commit()
+            if recovered:
+                logger.warning(f"Re-queued {recovered} Telegram message(s) interrupted by a restart")
+        self._thread = threading.Thread(target=self._run, name='telegram-outbox', daemon=True)
+        self._thread.start()
+        logger.info("Telegram outbox sender started")
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        _wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    wait = self.send_due()
+            except Exception as e:
+                logger.error(f"Error in Telegram outbox sender: {e}", exc_info=True)
+                wait = POLL_SECONDS
+            if wait > 0:
+                _wake.wait(wait)
+                _wake.clear()
+
+    def send_due(self) -> float:
+        """Delivers the next due message, if any. Returns how long to sleep before trying again."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if now - self._last_sent < TELEGRAM_MIN_INTERVAL:
+            return TELEGRAM_MIN_INTERVAL - (now - self._last_sent)
+        self._prune()
+
+        message = (OutboxMessage.query
+                   .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= datetime.utcnow())
+                   .order_by(OutboxMessage.id).first())
+        if message is None:
+            self._update_gauges()
+            upcoming = (db.session.query(func.min(OutboxMessage.next_attempt_at))
+                        .filter(OutboxMessage.status == 'pending').scalar())
+            if upcoming is None:
+                return POLL_SECONDS
+            return min(max((upcoming - datetime.utcnow()).total_seconds(), 0.1), POLL_SECONDS)
+
+        message.status = 'sending'
+        message.attempts = (message.attempts or 0) + 1
+        db.session.commit()
+
+        try:
+            result = self.deliver(message.text)
+        except Exception as e:
+            result = {'ok': False, 'error': str(e)}
+        self._last_sent = time.monotonic()
+
+        if result.get('ok'):
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.telegram_message_id = result.get('message_id')
+            message.last_error = None
+        else:
+            message.last_error = result.get('error') or 'Unknown error'
+            retry_after = result.get('retry_after')
+            if retry_after:
+                # Flood control applies to the whole bot, so pause every message, not just this one
+                logger.warning(f"Telegram asked to retry after {retry_after}s, pausing the outbox")
+                self._paused_until = time.monotonic() + retry_after
+                message.status = 'pending'
+                message.attempts -= 1  # Being throttled isn't the message's fault
+                message.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_after)
+            elif result.get('permanent') or message.attempts >= TELEGRAM_MAX_ATTEMPTS:
+                logger.error(f"Giving up on Telegram message {message.idempotency_key} after {message.attempts} attempt(s): {message.last_error}")
+                message.status = 'failed'
+            else:
+                delay = retry_delay(message.attempts)
+                logger.warning(f"Telegram message {message.idempotency_key} failed (attempt {message.attempts}), retrying in {delay:.0f}s: {message.last_error}")
+                message.status = 'pending'
+                message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        return 0
+
+    def _prune(self):
+        if time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(days=OUTBOX_RETENTION_DAYS)
+        deleted = OutboxMessage.query.filter(OutboxMessage.status == 'sent', OutboxMessage.sent_at < cutoff).delete()
+        db.session.commit()
+        if deleted:
+            logger.info(f"Deleted {deleted} delivered Telegram message(s) older than {OUTBOX_RETENTION_DAYS} days")
+
+    def _update_gauges(self):
+        for status, count in outbox_stats()['counts'].items():
+            OUTBOX_MESSAGES.set(count, status=status)
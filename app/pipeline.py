@@ -0,0 +1,148 @@
+import logging
+import threading
+from contextlib import ExitStack
+from queue import Queue
+from typing import Callable, Dict, List, Optional
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = registry.gauge('artist_tracker_pipeline_queue_depth', 'Items waiting in each pipeline stage queue.', ('stage',))
+IN_FLIGHT = registry.gauge('artist_tracker_pipeline_in_flight', 'Items currently being processed by each pipeline stage.', ('stage',))
+
+# Sentinel telling a worker to exit once everything queued before it has been processed
+_STOP = object()
+
+# The pipeline of the check that is currently running, if any (read by /api/pipeline). Scheduled and manual
+# runs share the web server's process (main.py runs without the reloader), so this covers both.
+_current_pipeline: Optional['Pipeline'] = None
+_current_lock = threading.Lock()
+
+
+class Stage:
+    """A pool of worker threads reading from a bounded queue and passing results to the next stage.
+
+    `func` returns the item to forward, or None to drop it. Because the queue is bounded,
+    a slow stage blocks the stage feeding it instead of letting work pile up in memory.
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, maxsize: int = 8):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.inbox: Queue = Queue(maxsize=max(1, maxsize))
+        self.outbox: Optional[Queue] = None
+        self._next_name: Optional[str] = None
+        self.processed = 0
+        self.in_flight = 0
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self.inbox.put(item)
+        QUEUE_DEPTH.set(self.inbox.qsize(), stage=self.name)
+
+    def start(self, worker_context: Optional[Callable] = None):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(worker_context,),
+                                      name=f"pipeline-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop_and_join(self):
+        """Lets the workers drain the queue, then waits for them to exit."""
+        for _ in self._threads:
+            self.inbox.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        QUEUE_DEPTH.set(0, stage=self.name)
+
+    def _work(self, worker_context: Optional[Callable]):
+        with ExitStack() as stack:
+            if worker_context is not None:
+                stack.enter_context(worker_context())
+            while True:
+                item = self.inbox.get()
+                QUEUE_DEPTH.set(self.inbox.qsize(), stage=self.name)
+                if item is _STOP:
+                    break
+                with self._lock:
+                    self.in_flight += 1
+                IN_FLIGHT.inc(stage=self.name)
+                try:
+                    result = self.func(item)
+                except Exception as e:
+                    # Stage functions are expected to record their own failures on the item
+                    logger.error(f"Unhandled error in pipeline stage '{self.name}': {e}", exc_info=True)
+                    result = None
+                finally:
+                    IN_FLIGHT.dec(stage=self.name)
+                    with self._lock:
+                        self.in_flight -= 1
+                        self.processed += 1
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+                    QUEUE_DEPTH.set(self.outbox.qsize(), stage=self._next_name)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'workers': self.workers,
+                'queue_depth': self.inbox.qsize(),
+                'queue_size': self.inbox.maxsize,
+                'in_flight': self.in_flight,
+                'processed': self.processed,
+            }
+
+
+class Pipeline:
+    """Chains stages with bounded queues: items submitted to the first stage flow through all of them."""
+
+    def __init__(self, stages: List[Stage], worker_context: Optional[Callable] = None):
+        self.stages = stages
+        self.worker_context = worker_context
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.outbox = next_stage.inbox
+            stage._next_name = next_stage.name
+        self.submitted = 0
+
+    def __enter__(self):
+        global _current_pipeline
+        for stage in self.stages:
+            stage.start(self.worker_context)
+        with _current_lock:
+            _current_pipeline = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, item):
+        """Adds an item to the first stage, blocking while its queue is full (backpressure)."""
+        self.stages[0].put(item)
+        self.submitted += 1
+
+    def close(self):
+        """Drains the stages in order and waits for all workers to finish."""
+        global _current_pipeline
+        for stage in self.stages:
+            stage.stop_and_join()
+        with _current_lock:
+            if _current_pipeline is self:
+                _current_pipeline = None
+
+    def status(self) -> Dict:
+        return {'submitted': self.submitted, 'stages': [stage.status() for stage in self.stages]}
+
+
+def current_status() -> Dict:
+    """Status of the pipeline of the run in progress, for the UI and API."""
+    with _current_lock:
+        pipeline = _current_pipeline
+    if pipeline is None:
+        return {'running': False, 'stages': []}
+    status = pipeline.status()
+    status['running'] = True
+    return status
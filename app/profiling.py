@@ -0,0 +1,112 @@
+import cProfile
+import io
+import logging
+import pstats
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path('/app/data/profiles')
+DEFAULT_RETENTION = 20
+# Number of functions included in the human readable summary
+SUMMARY_LIMIT = 60
+
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def _slug(label: str) -> str:
+    return _SAFE_NAME.sub('_', label).strip('_')[:60] or 'check'
+
+
+class ProfileSession:
+    """Collects one cProfile profiler per thread taking part in a profiled check."""
+
+    def __init__(self):
+        self.profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile_thread(self):
+        """Profiles the calling thread (e.g. a pipeline worker) for the duration of the block."""
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+
+
+@contextmanager
+def maybe_profile(enabled: bool, label: str, retention: int = DEFAULT_RETENTION):
+    """Profiles the wrapped block with cProfile when `enabled`, otherwise does nothing.
+
+    Yields a ProfileSession (or None) so worker threads can add their own profiles.
+    The disabled path is a single boolean check, so leaving this in place costs nothing.
+    """
+    if not enabled:
+        yield None
+        return
+
+    session = ProfileSession()
+    try:
+        with session.profile_thread():
+            yield session
+    finally:
+        try:
+            path = save_profile(session.profilers, label)
+            prune_profiles(retention)
+            logger.info(f"Saved profile for {label} to {path}")
+        except Exception as e:
+            logger.error(f"Failed to save profile for {label}: {e}")
+
+
+def save_profile(profilers: List[cProfile.Profile], label: str) -> Path:
+    """Merges the profilers and writes the raw .prof file (for snakeviz/pstats) and a plain-text summary."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{_slug(label)}"
+    prof_path = PROFILE_DIR / f"{stem}.prof"
+
+    summary = io.StringIO()
+    stats = pstats.Stats(profilers[0], stream=summary)
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.dump_stats(str(prof_path))
+    stats.sort_stats('cumulative').print_stats(SUMMARY_LIMIT)
+    (PROFILE_DIR / f"{stem}.txt").write_text(summary.getvalue())
+    return prof_path
+
+
+def list_profiles() -> List[Dict]:
+    """Saved profiles, newest first."""
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = []
+    for prof_path in sorted(PROFILE_DIR.glob('*.prof'), reverse=True):
+        summary_path = prof_path.with_suffix('.txt')
+        stat = prof_path.stat()
+        profiles.append({
+            'name': prof_path.name,
+            'summary': summary_path.name if summary_path.exists() else None,
+            'size': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_mtime),
+        })
+    return profiles
+
+
+def prune_profiles(retention: Optional[int] = DEFAULT_RETENTION):
+    """Deletes the oldest profiles so at most `retention` are kept."""
+    retention = max(retention or DEFAULT_RETENTION, 1)
+    for profile in list_profiles()[retention:]:
+        for name in (profile['name'], profile['summary']):
+            if name:
+                try:
+                    (PROFILE_DIR / name).unlink()
+                except OSError as e:
+                    logger.warning(f"Could not delete old profile {name}: {e}")
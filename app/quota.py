@@ -0,0 +1,183 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import pytz
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from app import app, db
+from app.cache import cached_settings
+from app.metrics import registry
+from app.models import ApiUsage, ArtistCheck, Settings
+
+logger = logging.getLogger(__name__)
+
+vancouver_tz = pytz.timezone('America/Vancouver')
+
+# Budgeted services and what their daily budget counts
+SERVICES = {
+    'ticketmaster': 'calls',
+    'firecrawl': 'calls',
+    'gemini': 'tokens',
+}
+
+API_CALLS = registry.counter('artist_tracker_api_calls_total', 'Calls made to external APIs.', ('service',))
+API_TOKENS = registry.counter('artist_tracker_api_tokens_total', 'Tokens used by LLM calls.', ('service',))
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of calling an API whose daily budget is used up."""
+
+
+def usage_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def record_usage(service: str, calls: int = 1, tokens: int = 0):
+    """Adds to today's usage of `service`. Safe to call from any thread, with or without an app context."""
+    API_CALLS.inc(calls, service=service)
+    if tokens:
+        API_TOKENS.inc(tokens, service=service)
+    try:
+        # A context of its own, so the caller's session and transaction are left alone
+        with app.app_context():
+            statement = insert(ApiUsage).values(service=service, day=usage_day(), calls=calls, tokens=tokens)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['service', 'day'],
+                set_={'calls': ApiUsage.calls + calls, 'tokens': ApiUsage.tokens + tokens},
+            ))
+            db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to record {service} usage: {e}")
+
+
+def daily_budgets(settings: Settings) -> Dict[str, Optional[int]]:
+    """Configured daily budget per service; None means no limit."""
+    return {
+        'ticketmaster': settings.ticketmaster_daily_budget,
+        'firecrawl': settings.firecrawl_daily_budget,
+        'gemini': settings.gemini_daily_token_budget,
+    }
+
+
+def usage_today() -> Dict[str, int]:
+    """Today's usage per service, in the unit its budget counts."""
+    rows = ApiUsage.query.filter_by(day=usage_day()).all()
+    used = {service: 0 for service in SERVICES}
+    for row in rows:
+        if row.service in used:
+            used[row.service] = (row.tokens if SERVICES[row.service] == 'tokens' else row.calls) or 0
+    return used
+
+
+def remaining_budgets(settings: Optional[Settings] = None) -> Dict[str, Optional[int]]:
+    """What is left of each service's budget today; None means no limit."""
+    budgets = daily_budgets(settings or cached_settings())
+    used = usage_today()
+    return {service: None if budget is None else max(budget - used[service], 0)
+            for service, budget in budgets.items()}
+
+
+def budget_status() -> List[Dict]:
+    """Per-service usage, budget and remaining budget for today, for the settings page."""
+    budgets = daily_budgets(cached_settings())
+    used = usage_today()
+    return [{
+        'service': service,
+        'unit': unit,
+        'used': used[service],
+        'budget': budgets[service],
+        'remaining': None if budgets[service] is None else max(budgets[service] - used[service], 0),
+    } for service, unit in SERVICES.items()]
+
+
+def usage_history(days: int = 7) -> List[Dict]:
+    since = usage_day(datetime.utcnow() - timedelta(days=days - 1))
+    rows = ApiUsage.query.filter(ApiUsage.day >= since).order_by(ApiUsage.day, ApiUsage.service).all()
+    return [{'day': row.day, 'service': row.service, 'calls': row.calls, 'tokens': row.tokens} for row in rows]
+
+
+def ensure_budget(service: str):
+    """Raises BudgetExhausted if today's budget for `service` is used up. Works from any thread."""
+    try:
+        with app.app_context():
+            remaining = remaining_budgets().get(service)
+    except Exception as e:
+        # Budgets are a safeguard; an unreadable database shouldn't stop checks
+        logger.error(f"Could not read the {service} budget: {e}")
+        return
+    if remaining is not None and remaining <= 0:
+        raise BudgetExhausted(f"{service} daily budget exhausted")
+
+
+@dataclass
+class CheckEstimate:
+    """Expected API usage of one artist's check."""
+    costs: Dict[str, int] = field(default_factory=dict)  # service -> calls or tokens
+    urls: Set[str] = field(default_factory=set)  # normalized URLs the check would scrape
+
+
+def recent_yield(artist_ids: List[int], days: int = 28) -> Dict[int, float]:
+    """Average number of dates found per completed check of each artist over the last `days`."""
+    if not artist_ids:
+        return {}
+    # Check times are stored as naive Vancouver time
+    since = datetime.now(vancouver_tz).replace(tzinfo=None) - timedelta(days=days)
+    rows = db.session.query(ArtistCheck.artist_id, func.avg(ArtistCheck.dates_found)).filter(
+        ArtistCheck.artist_id.in_(artist_ids), ArtistCheck.status == 'completed', ArtistCheck.started_at >= since,
+    ).group_by(ArtistCheck.artist_id).all()
+    return {artist_id: float(average or 0) for artist_id, average in rows}
+
+
+def recent_llm_bytes(artist_id: int, checks: int = 5) -> Optional[float]:
+    """Average prompt bytes the artist's last few completed checks sent to the LLM, None without history."""
+    rows = db.session.query(ArtistCheck.llm_bytes_sent).filter(
+        ArtistCheck.artist_id == artist_id, ArtistCheck.status == 'completed',
+    ).order_by(ArtistCheck.id.desc()).limit(checks).all()
+    if not rows:
+        return None
+    return sum(row[0] or 0 for row in rows) / len(rows)
+
+
+def check_value(last_checked: Optional[datetime], average_dates: float, now: Optional[datetime] = None) -> float:
+    """How worthwhile checking an artist is now: hours since its last check, weighted by how many
+    dates its checks usually find. Artists never checked come first."""
+    if last_checked is None:
+        return math.inf
+    now = now or datetime.now(vancouver_tz).replace(tzinfo=None)
+    hours = max((now - last_checked.replace(tzinfo=None)).total_seconds() / 3600, 0.0)
+    return hours * (1 + average_dates)
+
+
+def plan_checks(artists: List, value: Callable[[object], float], estimate: Callable[[object, Set[str]], CheckEstimate],
+                remaining: Dict[str, Optional[int]]) -> Tuple[List, List]:
+    """Orders artists by value and keeps those whose estimated usage fits the remaining budgets.
+
+    Returns (planned, deferred). Deferred artists aren't checked this run; having waited longer,
+    they rank higher in the next one. Pages shared by several artists are only counted once.
+    """
+    remaining = dict(remaining)
+    planned, deferred = [], []
+    planned_urls: Set[str] = set()
+    for artist in sorted(artists, key=value, reverse=True):
+        try:
+            check = estimate(artist, planned_urls)
+        except Exception as e:
+            logger.error(f"Could not estimate the API usage of {artist.name}, planning it without one: {e}")
+            check = CheckEstimate()
+        over = [service for service, cost in check.costs.items()
+                if cost and remaining.get(service) is not None and cost > remaining[service]]
+        if over:
+            logger.info(f"Deferring {artist.name}: estimated usage {check.costs} exceeds the remaining "
+                        f"{', '.join(over)} budget")
+            deferred.append(artist)
+            continue
+        for service, cost in check.costs.items():
+            if remaining.get(service) is not None:
+                remaining[service] -= cost
+        planned_urls |= check.urls
+        planned.append(artist)
+    return planned, deferred
@@ -1,8 +1,18 @@
-from flask import render_template, request, redirect, url_for, flash, Response, jsonify
+from flask import render_template, request, redirect, url_for, flash, Response, jsonify, send_from_directory, abort, make_response, session
 from app import app, db
-from app.models import Artist, Settings
+from app.models import Artist, Settings, CheckRun
 from app.utils import check_all_artists, TourScraper, TelegramNotifier, FileLogger, logger
-from datetime import datetime
+from app.metrics import registry as metrics_registry
+from app.profiling import maybe_profile, list_profiles, PROFILE_DIR
+from app.snapshots import delete_snapshots
+from app.pipeline import current_status
+from app.outbox import outbox_stats
+from app.quota import budget_status, usage_history
+from app.breaker import breaker_states, reset_breaker, source_label
+from app.cache import Snapshot, cached_settings, dashboard_cache, invalidate_dashboard, invalidate_settings
+from app.deadline import ARTIST_DEADLINE_SECONDS, Deadline
+from app.history import start_run, finish_run, start_artist_check, finish_artist_check, recent_runs, run_time_breakdown
+from datetime import datetime, timedelta, timezone
 import json
 from queue import Queue
 import threading
@@ -49,14 +59,39 @@ def format_date_for_display(dt):
     
     return f"{month} {day}, {time_str}"
 
-@app.route('/')
-def index():
-    artists = Artist.query.all()
-    # Get latest logs for initial display
-    latest_logs = file_logger.get_latest_logs(20)
-    
+def profile_override():
+    """Reads ?profile=1/0 from the request. None means fall back to the profiling setting"""
+    profile_arg = request.args.get('profile')
+    if profile_arg is None:
+        return None
+    return profile_arg.lower() in ('1', 'true', 'yes', 'on')
+
+app.jinja_env.filters['friendly_datetime'] = format_date_for_display
+
+def conditional_response(etag, last_modified, render):
+    """Answers 304 Not Modified, without calling `render`, when the client's copy is current by its ETag
+    (or, without one, by Last-Modified). Pages with flashed messages to show are always rendered, uncached."""
+    if '_flashes' in session:
+        return render()
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = (last_modified is not None and request.if_modified_since is not None
+                 and last_modified <= request.if_modified_since)
+    response = Response(status=304) if fresh else make_response(render())
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Browsers may keep the page, but have to ask whether it is still current
+    response.cache_control.no_cache = True
+    return response
+
+def build_dashboard():
+    """View model of the dashboard, and when it expires (the next scheduled check)"""
+    artists = [Snapshot(artist) for artist in Artist.query.all()]
+
     # Get schedule information
-    settings = Settings.get_settings()
+    settings = cached_settings()
     times = [t.strip() for t in settings.check_frequency.split(',')]
     
     # Get next scheduled time
@@ -67,7 +102,7 @@ def index():
         schedule_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
         if schedule_time <= now:
             # If the scheduled time is in the past for today, schedule it for tomorrow
-            schedule_time = schedule_time.replace(day=now.day + 1)
+            schedule_time += timedelta(days=1)
         schedule_times.append(schedule_time)
     
     next_schedule = min(schedule_times) if schedule_times else None
@@ -81,11 +116,22 @@ def index():
             last_check = max(a.last_checked for a in checked_artists)
     
     last_check_formatted = format_date_for_display(last_check) if last_check else None
-    
-    return render_template('index.html', artists=artists, initial_logs=latest_logs, 
-                          next_schedule=next_schedule, last_check=last_check,
-                          next_schedule_formatted=next_schedule_formatted,
-                          last_check_formatted=last_check_formatted)
+
+    # Run history panel: latest runs and the artists that dominated recent run time
+    runs = [Snapshot(run) for run in recent_runs(5)]
+    slowest_artists = run_time_breakdown(days=28)['artists'][:5]
+    breakers = breaker_states()
+
+    model = dict(artists=artists, next_schedule=next_schedule, last_check=last_check,
+                 next_schedule_formatted=next_schedule_formatted,
+                 last_check_formatted=last_check_formatted,
+                 recent_runs=runs, slowest_artists=slowest_artists, breakers=breakers)
+    return model, next_schedule
+
+@app.route('/')
+def index():
+    model, etag, built_at = dashboard_cache.get(build_dashboard)
+    return conditional_response(etag, built_at, lambda: render_template('index.html', **model))
 
 @app.route('/events')
 def events():
@@ -105,8 +151,12 @@ def events():
 @app.route('/logs')
 def get_logs():
     """API endpoint to get latest logs"""
-    logs = file_logger.get_latest_logs(100)
-    return jsonify(logs)
+    version = file_logger.version()
+    if version is None:
+        return jsonify(file_logger.get_latest_logs(100))
+    size, modified_ns = version
+    modified = datetime.fromtimestamp(modified_ns / 1e9, timezone.utc).replace(microsecond=0)
+    return conditional_response(f"{size}-{modified_ns}", modified, lambda: jsonify(file_logger.get_latest_logs(100)))
 
 @app.route('/logs/clear', methods=['POST'])
 def clear_logs():
@@ -114,6 +164,63 @@ def clear_logs():
     file_logger.clear_logs()
     return jsonify({'status': 'success'})
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of per-stage counters and latency histograms"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/runs')
+def api_runs():
+    """API endpoint listing recent check runs"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify([run.to_dict() for run in recent_runs(min(max(limit, 1), 500))])
+
+@app.route('/api/runs/<int:id>')
+def api_run_detail(id):
+    """API endpoint with per-artist and per-URL timings for one run"""
+    run = CheckRun.query.get_or_404(id)
+    return jsonify(run.to_dict(include_checks=True))
+
+@app.route('/api/runs/stats')
+def api_run_stats():
+    """API endpoint aggregating check time per artist, per URL and per week"""
+    days = request.args.get('days', 28, type=int)
+    return jsonify(run_time_breakdown(days=min(max(days, 1), 365)))
+
+@app.route('/api/outbox')
+def api_outbox():
+    """API endpoint with Telegram outbox counts per status and recent delivery failures"""
+    return jsonify(outbox_stats())
+
+@app.route('/api/usage')
+def api_usage():
+    """Today's API usage against the configured budgets, and the last week of usage."""
+    return jsonify({'today': budget_status(), 'history': usage_history()})
+
+@app.route('/api/breakers')
+def api_breakers():
+    return jsonify(breaker_states())
+
+@app.route('/breakers/<int:id>/reset', methods=['POST'])
+def reset_breaker_route(id):
+    breaker = reset_breaker(id)
+    if breaker is None:
+        abort(404)
+    log_message(f'Re-enabled {source_label(breaker.source)}', 'info')
+    flash(f'Re-enabled {source_label(breaker.source)}. It will be checked in the next run.', 'success')
+    return redirect(url_for('index'))
+
+@app.route('/api/artists')
+def api_artists():
+    model, etag, built_at = dashboard_cache.get(build_dashboard)
+    return conditional_response(f"{etag}-artists", built_at,
+                                lambda: jsonify([artist.to_dict() for artist in model['artists']]))
+
+@app.route('/api/pipeline')
+def api_pipeline():
+    """API endpoint showing queue depth and in-flight work per stage of the running check"""
+    return jsonify(current_status())
+
 @app.route('/add_artist', methods=['GET', 'POST'])
 def add_artist():
     if request.method == 'POST':
@@ -127,6 +234,7 @@ def add_artist():
                         use_ticketmaster=use_ticketmaster, artist_type=artist_type)
         db.session.add(artist)
         db.session.commit()
+        invalidate_dashboard()
         log_message(f'Artist "{name}" added successfully!', 'success')
         flash('Artist added successfully!', 'success')
         return redirect(url_for('index'))
@@ -144,6 +252,7 @@ def edit_artist(id):
         artist.use_ticketmaster = 'use_ticketmaster' in request.form
         artist.artist_type = request.form.get('artist_type', 'music')
         db.session.commit()
+        invalidate_dashboard()
         log_message(f'Artist "{old_name}" updated to "{artist.name}"', 'success')
         flash('Artist updated successfully!', 'success')
         return redirect(url_for('index'))
@@ -157,11 +266,26 @@ def settings():
         settings.telegram_chat_id = request.form['telegram_chat_id']
         settings.openai_api_key = request.form['openai_api_key']
         settings.check_frequency = request.form['check_frequency']
+        settings.profiling_enabled = 'profiling_enabled' in request.form
+        settings.profile_retention = request.form.get('profile_retention', 20, type=int)
+        settings.match_radius_km = max(request.form.get('match_radius_km', 50, type=int) or 50, 1)
+        # Empty budgets mean no limit
+        settings.ticketmaster_daily_budget = request.form.get('ticketmaster_daily_budget', type=int)
+        settings.firecrawl_daily_budget = request.form.get('firecrawl_daily_budget', type=int)
+        settings.gemini_daily_token_budget = request.form.get('gemini_daily_token_budget', type=int)
         settings.last_updated = datetime.utcnow()
         db.session.commit()
+        invalidate_settings()
         flash('Settings updated successfully!', 'success')
         return redirect(url_for('settings'))
-    return render_template('settings.html', settings=settings)
+    return render_template('settings.html', settings=settings, profiles=list_profiles(), budgets=budget_status())
+
+@app.route('/profiles/<path:filename>')
+def download_profile(filename):
+    """Download a saved .prof file or its text summary"""
+    if not filename.endswith(('.prof', '.txt')):
+        abort(404)
+    return send_from_directory(PROFILE_DIR, filename, as_attachment=filename.endswith('.prof'))
 
 @app.route('/check_artist/<int:id>')
 def check_artist_route(id):
@@ -174,18 +298,38 @@ def check_artist_route(id):
         scraper = TourScraper()
         notifier = TelegramNotifier()
 
-        # Pass notifier to the check_artist method
-        tour_dates = scraper.check_artist(artist, notifier)
+        # Record the manual check in the run history
+        run = start_run('manual_artist')
+        record = start_artist_check(run, artist)
+        settings = cached_settings()
+        profiling = profile_override()
+        if profiling is None:
+            profiling = settings.profiling_enabled
+        try:
+            with maybe_profile(profiling, f"artist_{artist.id}_{artist.name}",
+                               settings.profile_retention):
+                # Pass notifier to the check_artist method
+                deadline = Deadline(ARTIST_DEADLINE_SECONDS, 'artist')
+                tour_dates = scraper.check_artist(artist, notifier, record, deadline)
+        except Exception as e:
+            db.session.rollback()
+            finish_artist_check(record, 'failed', str(e))
+            finish_run(run, 'failed')
+            raise
+        finally:
+            scraper.close()
+        finish_artist_check(record, 'timeout' if deadline.missed else 'completed', deadline.missed)
+        finish_run(run)
 
         # --- Success Notification/Flash Message Logic ---
         if tour_dates:
             if notifier.is_configured():
-                if notifier.send_tour_dates(artist.name, tour_dates):
-                    log_message(f'Found {len(tour_dates)} tour dates for {artist.name} and sent notification!', 'success')
-                    flash(f'Found {len(tour_dates)} tour dates for {artist.name} and sent notification!', 'success')
+                if notifier.send_tour_dates(artist.name, tour_dates, f"run{run.id}:artist{artist.id}:dates"):
+                    log_message(f'Found {len(tour_dates)} tour dates for {artist.name} and queued notification!', 'success')
+                    flash(f'Found {len(tour_dates)} tour dates for {artist.name} and queued notification!', 'success')
                 else:
-                    log_message(f'Found {len(tour_dates)} tour dates for {artist.name} but failed to send notification.', 'warning')
-                    flash(f'Found {len(tour_dates)} tour dates for {artist.name} but failed to send notification (check logs/settings).', 'warning')
+                    log_message(f'Found {len(tour_dates)} tour dates for {artist.name} but failed to queue notification.', 'warning')
+                    flash(f'Found {len(tour_dates)} tour dates for {artist.name} but failed to queue notification (check logs/settings).', 'warning')
             else:
                 log_message(f'Found {len(tour_dates)} tour dates for {artist.name}. Telegram not configured.', 'success')
                 flash(f'Found {len(tour_dates)} tour dates for {artist.name}. (Telegram not configured)', 'success')
@@ -208,7 +352,7 @@ def check_all_artists_route():
     log_message('Starting manual check for all artists...', 'info')
     flash('Checking all artists... This may take some time.', 'info')
     try:
-        check_all_artists() # Call the utility function
+        check_all_artists(trigger='manual', profile=profile_override()) # Call the utility function
         log_message('Manual check for all artists completed.', 'info')
         # Flash message for completion will be handled by individual artist checks or the final log
     except Exception as e:
@@ -224,7 +368,9 @@ def delete_artist(id):
         artist = Artist.query.get_or_404(id)
         name = artist.name
         db.session.delete(artist)
+        delete_snapshots(id)
         db.session.commit()
+        invalidate_dashboard()
         log_message(f'Artist "{name}" has been deleted.', 'success')
         flash(f'Artist "{name}" has been deleted.', 'success')
     except Exception as e:
@@ -0,0 +1,58 @@
+import logging
+import os
+import signal
+import sys
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# How long a stopping process waits for running checks to finish their in-flight artists.
+# Keep it below the container's stop timeout (stop_grace_period in docker-compose.yml).
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', '110'))
+
+_requested = threading.Event()
+_runs = 0
+_runs_changed = threading.Condition()
+
+
+def install_signal_handlers():
+    """Turns SIGTERM (docker stop) into a normal exit of the main thread, like Ctrl-C, so cleanup code runs."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def request_shutdown():
+    if not _requested.is_set():
+        logger.info("Shutdown requested: no new artists will be started")
+        _requested.set()
+
+
+def shutdown_requested() -> bool:
+    return _requested.is_set()
+
+
+def wait(seconds: float) -> bool:
+    """Sleeps up to `seconds`, returning True early if shutdown is requested."""
+    return _requested.wait(seconds)
+
+
+@contextmanager
+def run_in_progress():
+    """Marks a check run as active, so shutdown waits for it."""
+    global _runs
+    with _runs_changed:
+        _runs += 1
+    try:
+        yield
+    finally:
+        with _runs_changed:
+            _runs -= 1
+            _runs_changed.notify_all()
+
+
+def wait_until_idle(timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+    """Waits for active runs to finish. Returns False if some were still running after `timeout`."""
+    with _runs_changed:
+        if _runs:
+            logger.info(f"Waiting up to {timeout:.0f}s for {_runs} running check(s) to finish their in-flight artists")
+        return _runs_changed.wait_for(lambda: _runs == 0, timeout)
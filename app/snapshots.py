@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import re
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from app import db
+from app.extraction import EXTRACTION_VERSION
+from app.models import PageSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Sections longer than this are split further at blank lines so a page without
+# headings (or with one huge section) still diffs at a useful granularity
+MAX_SECTION_CHARS = 3000
+
+_HEADING = re.compile(r'^\s{0,3}#{1,6}\s')
+
+
+def split_sections(markdown: str) -> List[str]:
+    """Splits markdown into sections at headings, each section starting with its heading line."""
+    sections: List[List[str]] = [[]]
+    for line in markdown.splitlines():
+        if _HEADING.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    result = []
+    for lines in sections:
+        text = '\n'.join(lines).strip()
+        if not text:
+            continue
+        if len(text) <= MAX_SECTION_CHARS:
+            result.append(text)
+            continue
+        # Split oversized sections into paragraph groups
+        current = ''
+        for paragraph in re.split(r'\n\s*\n', text):
+            if current and len(current) + len(paragraph) > MAX_SECTION_CHARS:
+                result.append(current)
+                current = paragraph
+            else:
+                current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            result.append(current)
+    return result
+
+
+def section_hash(section: str) -> str:
+    # Normalise whitespace so reflowed but otherwise identical text isn't treated as a change
+    normalized = ' '.join(section.split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def context_key() -> str:
+    """Identifies how the stored dates were extracted; a change forces a full re-extraction.
+
+    Dates are extracted for every location and filtered afterwards, so editing an artist's
+    locations doesn't invalidate the snapshots.
+    """
+    return hashlib.sha1(f"{EXTRACTION_VERSION}".encode('utf-8')).hexdigest()
+
+
+@dataclass
+class ExtractionPlan:
+    """What needs to be sent to the LLM for one page, and what can be reused from the last snapshot."""
+    url: str
+    content: str
+    context: str
+    # (hash, text) of sections that are new or changed since the last snapshot
+    changed_sections: List[Tuple[str, str]] = field(default_factory=list)
+    # Dates carried over from unchanged sections, keyed by section hash
+    reused_dates: Dict[str, List[Dict]] = field(default_factory=dict)
+    section_hashes: List[str] = field(default_factory=list)
+    had_snapshot: bool = False
+
+
+def plan_extraction(artist_id: int, url: str, content: str) -> ExtractionPlan:
+    """Diffs `content` against the stored snapshot at section level.
+
+    Sections that disappeared are simply not carried over, which drops their dates.
+    """
+    plan = ExtractionPlan(url=url, content=content, context=context_key())
+    snapshot = PageSnapshot.query.filter_by(artist_id=artist_id, url=url).first()
+    previous: Dict[str, List[Dict]] = {}
+    if snapshot and snapshot.context_key == plan.context:
+        plan.had_snapshot = True
+        try:
+            previous = json.loads(snapshot.section_dates or '{}')
+        except ValueError:
+            logger.warning(f"Corrupt snapshot for {url}, re-extracting the whole page")
+            previous = {}
+            plan.had_snapshot = False
+
+    seen = set()
+    for section in split_sections(content):
+        digest = section_hash(section)
+        plan.section_hashes.append(digest)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        if digest in previous:
+            plan.reused_dates[digest] = previous[digest]
+        else:
+            plan.changed_sections.append((digest, section))
+    return plan
+
+
+def save_snapshot(artist_id: int, plan: ExtractionPlan, new_dates: Dict[str, List[Dict]]):
+    """Stores the page content (compressed) and the merged per-section dates."""
+    section_dates = dict(plan.reused_dates)
+    for digest, _ in plan.changed_sections:
+        section_dates[digest] = new_dates.get(digest, [])
+
+    snapshot = PageSnapshot.query.filter_by(artist_id=artist_id, url=plan.url).first()
+    if not snapshot:
+        snapshot = PageSnapshot(artist_id=artist_id, url=plan.url)
+        db.session.add(snapshot)
+    snapshot.context_key = plan.context
+    snapshot.content = zlib.compress(plan.content.encode('utf-8'))
+    snapshot.section_dates = json.dumps(section_dates)
+    snapshot.updated_at = datetime.utcnow()
+
+
+def merged_dates(plan: ExtractionPlan, new_dates: Dict[str, List[Dict]]) -> List[Dict]:
+    """All dates for the page: reused ones from unchanged sections plus freshly extracted ones."""
+    dates = []
+    for digest in dict.fromkeys(plan.section_hashes):
+        section = plan.reused_dates.get(digest)
+        if section is None:
+            section = new_dates.get(digest, [])
+        dates.extend(dict(date) for date in section)
+    return dates
+
+
+def delete_snapshots(artist_id: int):
+    PageSnapshot.query.filter_by(artist_id=artist_id).delete()
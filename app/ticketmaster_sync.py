@@ -0,0 +1,196 @@
+import json
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app import db
+from app.models import TicketmasterEvent, TicketmasterSync
+
+logger = logging.getLogger(__name__)
+
+# Hours between full syncs of a query; in between only events whose public on-sale started since the last
+# sync are fetched, which is when newly announced shows appear. 0 makes every sync a full one.
+TICKETMASTER_FULL_SYNC_HOURS = float(os.getenv('TICKETMASTER_FULL_SYNC_HOURS', '24'))
+# A full sync is due this much early, so one that ran a little later in yesterday's run than today's
+# doesn't slip to the next run
+FULL_SYNC_SLACK = timedelta(hours=1)
+# Incremental syncs look this far back before the last sync, for events listed a little after their on-sale began
+ON_SALE_SLACK = timedelta(days=1)
+
+# Ticketmaster classification names for each Artist.artist_type
+CLASSIFICATIONS = {
+    'music': 'Music',
+    'comedy': 'Comedy',
+}
+
+
+def query_key(keyword: str, location_params: Dict, classification: Optional[str]) -> str:
+    location = '&'.join(f"{name}={str(value).strip().lower()}" for name, value in sorted(location_params.items()))
+    return f"{(classification or 'any').lower()}|{keyword.strip().lower()}|{location}"
+
+
+def sync_window(key: str) -> Tuple[bool, datetime, Optional[datetime]]:
+    """Returns (full, start, on_sale_since): whether the next sync of `key` must be a full one, the
+    startDateTime to use and, for an incremental sync, the onsaleStartDateTime to use."""
+    now = datetime.utcnow().replace(microsecond=0)
+    sync = TicketmasterSync.query.filter_by(query_key=key).first()
+    if (sync is None or sync.last_full_sync_at is None or sync.last_sync_at is None or TICKETMASTER_FULL_SYNC_HOURS <= 0
+            or now - sync.last_full_sync_at >= timedelta(hours=TICKETMASTER_FULL_SYNC_HOURS) - FULL_SYNC_SLACK):
+        return True, now, None
+    # New shows go on sale after they are announced, whatever their date; shows already known are
+    # kept from earlier syncs
+    return False, now, (sync.last_sync_at - ON_SALE_SLACK).replace(microsecond=0)
+
+
+def estimated_sync_pages(key: str, page_size: int, max_pages: int) -> int:
+    """Result pages the next sync of `key` is expected to fetch: one for an incremental sync,
+    enough for the events seen last time on a full one."""
+    full, _, _ = sync_window(key)
+    if not full:
+        return 1
+    sync = TicketmasterSync.query.filter_by(query_key=key).first()
+    events = sync.event_count if sync is not None and sync.event_count else 0
+    return min(max(math.ceil(events / page_size), 1), max_pages)
+
+
+def event_start(start: Dict) -> Optional[datetime]:
+    """UTC start of a Discovery API event from its dates.start, falling back to the local date."""
+    try:
+        if start.get('dateTime'):
+            return datetime.strptime(start['dateTime'], '%Y-%m-%dT%H:%M:%SZ')
+        if start.get('localDate'):
+            return datetime.strptime(start['localDate'], '%Y-%m-%d')
+    except ValueError:
+        pass
+    return None
+
+
+def compact_event(event: Dict) -> Dict:
+    """The fields of a Discovery API event needed to match and report it."""
+    venue = event.get('_embedded', {}).get('venues', [{}])[0]
+    start = event.get('dates', {}).get('start', {})
+    return {
+        'id': event.get('id'),
+        'name': event.get('name', ''),
+        'venue': venue.get('name', 'Venue not specified'),
+        'city': venue.get('city', {}).get('name', ''),
+        'state_code': venue.get('state', {}).get('stateCode', ''),
+        'state_name': venue.get('state', {}).get('name', ''),
+        'country_code': venue.get('country', {}).get('countryCode', ''),
+        'local_date': start.get('localDate'),
+        'date_time': start.get('dateTime'),
+        'url': event.get('url', '#'),
+        'attractions': [attraction.get('name', '') for attraction in event.get('_embedded', {}).get('attractions', [])],
+    }
+
+
+# Paths (below each event) of the fields compact_event needs, for the streaming parser
+_EVENT_PREFIX = '_embedded.events.item'
+_STREAMED_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'url': 'url',
+    'dates.start.localDate': 'local_date',
+    'dates.start.dateTime': 'date_time',
+}
+_VENUE_FIELDS = {
+    'name': 'venue',
+    'city.name': 'city',
+    'state.stateCode': 'state_code',
+    'state.name': 'state_name',
+    'country.countryCode': 'country_code',
+}
+
+
+def stream_events(stream) -> Tuple[List[Dict], int]:
+    """Parses a Discovery API page incrementally, keeping only the fields compact_event returns.
+
+    Unlike response.json(), the full nested page (images, seat maps, price ranges...) is
+    never held in memory. Returns (compact events, total pages).
+    """
+    import ijson
+
+    events: List[Dict] = []
+    total_pages = 1
+    current: Optional[Dict] = None
+    venue_index = -1
+    event_prefix = _EVENT_PREFIX + '.'
+    venue_prefix = '_embedded.venues.item'
+    for prefix, kind, value in ijson.parse(stream):
+        if prefix == _EVENT_PREFIX:
+            if kind == 'start_map':
+                current = {'name': '', 'venue': 'Venue not specified', 'city': '', 'state_code': '', 'state_name': '',
+                           'country_code': '', 'local_date': None, 'date_time': None, 'url': '#', 'attractions': []}
+                venue_index = -1
+            elif kind == 'end_map' and current is not None:
+                events.append(current)
+                current = None
+            continue
+        if current is not None and prefix.startswith(event_prefix):
+            path = prefix[len(event_prefix):]
+            if path == venue_prefix and kind == 'start_map':
+                venue_index += 1
+            elif path in _STREAMED_FIELDS and kind in ('string', 'number'):
+                current[_STREAMED_FIELDS[path]] = value
+            elif path.startswith(venue_prefix + '.') and venue_index == 0 and kind == 'string':
+                field = _VENUE_FIELDS.get(path[len(venue_prefix) + 1:])
+                if field:
+                    current[field] = value
+            elif path == '_embedded.attractions.item.name' and kind == 'string':
+                current['attractions'].append(value)
+        elif prefix == 'page.totalPages' and kind == 'number':
+            total_pages = int(value)
+    return events, total_pages
+
+
+def store_sync(key: str, full: bool, start: datetime, events: List[Dict]) -> List[Dict]:
+    """Merges freshly fetched (compact) events into the stored ones, records the sync and returns all upcoming events."""
+    now = datetime.utcnow()
+    if full:
+        # A full sync is authoritative: events that disappeared (cancelled, moved) are dropped
+        TicketmasterEvent.query.filter_by(query_key=key).delete()
+        db.session.flush()
+    existing = {stored.event_id: stored for stored in TicketmasterEvent.query.filter_by(query_key=key).all()}
+
+    # Past events are never reported again
+    today = now.strftime('%Y-%m-%d')
+    horizon = start
+    for compact in events:
+        event_id = compact.pop('id', None)
+        if not event_id or (compact['local_date'] and compact['local_date'] < today):
+            continue
+        stored = existing.get(event_id)
+        if stored is None:
+            stored = TicketmasterEvent(query_key=key, event_id=event_id)
+            db.session.add(stored)
+            existing[event_id] = stored
+        stored.local_date = compact['local_date']
+        stored.data = json.dumps(compact)
+        stored.updated_at = now
+        starts = event_start({'dateTime': compact.get('date_time'), 'localDate': compact['local_date']})
+        if starts and starts > horizon:
+            horizon = starts
+
+    for event_id, stored in list(existing.items()):
+        if stored.local_date and stored.local_date < today:
+            db.session.delete(stored)
+            del existing[event_id]
+
+    sync = TicketmasterSync.query.filter_by(query_key=key).first()
+    if sync is None:
+        sync = TicketmasterSync(query_key=key)
+        db.session.add(sync)
+    sync.horizon = max(horizon, sync.horizon or horizon) if not full else horizon
+    sync.last_sync_at = now
+    if full:
+        sync.last_full_sync_at = now
+    sync.event_count = len(existing)
+    db.session.commit()
+    return [json.loads(stored.data) for stored in existing.values()]
+
+
+def stored_events(key: str) -> List[Dict]:
+    """Events kept from earlier syncs of `key`, used when Ticketmaster can't be reached."""
+    return [json.loads(stored.data) for stored in TicketmasterEvent.query.filter_by(query_key=key).all()]
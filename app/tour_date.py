@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+
+@dataclass(slots=True)
+class TourDate:
+    """One show found for an artist. Slotted, so large result sets don't carry a dict per date."""
+    artist: str
+    city: str
+    venue: str
+    date: str
+    ticket_url: str = '#'
+    source: str = ''
+    source_url: str = ''
+
+    @classmethod
+    def from_dict(cls, data: Dict, artist: str = '', source: str = '', source_url: str = '') -> 'TourDate':
+        """Builds a TourDate from an extracted or stored date dict."""
+        return cls(
+            artist=data.get('artist') or artist,
+            city=data.get('city') or 'N/A',
+            venue=data.get('venue') or 'N/A',
+            date=data.get('date') or 'N/A',
+            ticket_url=data.get('ticket_url') or '#',
+            source=data.get('source') or source,
+            source_url=data.get('source_url') or source_url,
+        )
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def key(self) -> Tuple[str, str, str, str]:
+        """Identity used to drop duplicates: (artist, venue, date, city), case-insensitive."""
+        return (self.artist.lower(), self.venue.lower(), self.date, self.city.lower())
@@ -1,27 +1,75 @@
+import importlib.util
 import logging
+import time
+import threading
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
 from datetime import datetime
 import json
-from typing import List, Dict, Optional
+import re
+from typing import List, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
 import requests
+import urllib3
 from app import app, db
-from app.models import Artist, Settings
-from google.generativeai import types
-from pydantic import BaseModel
-from firecrawl import FirecrawlApp
+from app.models import Artist, ArtistCheck
 import os
 import pytz
 from pathlib import Path
-import google.generativeai as genai
+from app.metrics import (
+    instrumented, STAGE_ERRORS, STAGE_CACHE_HITS, STAGE_DATES_FOUND,
+    LLM_PROMPT_BYTES, LLM_RESPONSE_BYTES,
+)
+from app.tour_date import TourDate
+from app.clients import firecrawl_app, gemini_model, http_session, registry as client_registry
+from app.outbox import enqueue_message
+from app.geo import LocationMatcher, DEFAULT_RADIUS_KM
+from app.ticketmaster_sync import (
+    CLASSIFICATIONS, compact_event, query_key, stream_events, sync_window, store_sync, stored_events,
+    estimated_sync_pages,
+)
+from app.profiling import maybe_profile, ProfileSession
+from app.pipeline import Pipeline, Stage
+from app.extraction import (
+    ExtractionSource, ExtractionResult, BatchOutcome, CHARS_PER_TOKEN, LLM_MAP_CONCURRENCY, build_prompt,
+    estimate_tokens, is_large_page, merge_results, pack_batches, parse_response, split_chunks,
+)
+from app.snapshots import plan_extraction, save_snapshot, merged_dates
+from app.quota import (
+    BudgetExhausted, CheckEstimate, check_value, ensure_budget, plan_checks, recent_llm_bytes, recent_yield,
+    record_usage, remaining_budgets,
+)
+from app.breaker import (
+    FIRECRAWL_SOURCE, GEMINI_SOURCE, TICKETMASTER_SOURCE, SourceDisabled, allow, claim_alerts, counts_as_outage, record_failure,
+    record_success, url_source,
+)
+from app.history import (
+    start_run, finish_run, start_artist_check, finish_artist_check, stage_timer, CheckStats,
+    checkpoint_artist_check, interrupt_run, run_to_resume,
+)
+from app.shutdown import run_in_progress, shutdown_requested
+from app.cache import cached_settings
+from app.deadline import ARTIST_DEADLINE_SECONDS, RUN_DEADLINE_SECONDS, Deadline, DeadlineExceeded, call_timeout
 
 # Configure logging
 log_dir = Path('/app/data/logs')
 log_dir.mkdir(parents=True, exist_ok=True)
 
+ACCESS_LINE = re.compile(r'"[A-Z]+ \S+ HTTP/[\d.]+" \d{3} ')
+
+def not_access_line(record: logging.LogRecord) -> bool:
+    """Keeps the request lines of the development server out of app.log: the dashboard polls /logs, and
+    logging each poll would change the file every time and defeat its ETag. They still reach the console."""
+    return not (record.name == 'werkzeug' and record.levelno < logging.WARNING
+                and ACCESS_LINE.search(record.getMessage()))
+
 # Configure file logger
 file_handler = logging.FileHandler(log_dir / 'app.log')
 file_handler.setFormatter(logging.Formatter(
     '%(asctime)s - %(levelname)s - %(message)s'
 ))
+file_handler.addFilter(not_access_line)
 
 # Configure console logger
 console_handler = logging.StreamHandler()
@@ -38,6 +86,35 @@ logger.addHandler(console_handler)
 # Set Vancouver timezone
 vancouver_tz = pytz.timezone('America/Vancouver')
 
+# Maximum number of Firecrawl scrapes running at the same time
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', '4'))
+# Seconds one call may take: a Ticketmaster request (connecting, and each read of a streamed page), a Firecrawl
+# scrape (passed to Firecrawl as its page load timeout, and how long a check waits for the result), a Gemini request
+TICKETMASTER_TIMEOUT = float(os.getenv('TICKETMASTER_TIMEOUT', '30'))
+FIRECRAWL_TIMEOUT = float(os.getenv('FIRECRAWL_TIMEOUT', '60'))
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '120'))
+# Firecrawl answers that disable Firecrawl as a whole rather than the page being scraped
+FIRECRAWL_OUTAGE_STATUSES = (401, 402, 429)
+# Extra time a check waits for a scrape beyond FIRECRAWL_TIMEOUT, for the request around Firecrawl's page load
+SCRAPE_WAIT_GRACE = 15.0
+# Gemini tokens assumed per URL when planning the check of an artist with no check history
+PLANNER_TOKENS_PER_URL = int(os.getenv('PLANNER_TOKENS_PER_URL', '8000'))
+
+def artist_urls(artist: Artist) -> List[str]:
+    """The artist's URLs to scrape, without blanks or repeats, in the order they were entered."""
+    if not artist.urls:
+        return []
+    return list(dict.fromkeys(url.strip() for url in artist.urls.replace('\n', ',').split(',') if url.strip()))
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL, so trivially different spellings of the same page are only scraped once."""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip('/') if parts.path not in ('', '/') else ''
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+# Bytes read at a time when reading the end of the log file
+LOG_TAIL_BLOCK = 8192
+
 class FileLogger:
     def __init__(self):
         self.log_dir = log_dir
@@ -45,13 +122,32 @@ class FileLogger:
     def get_latest_logs(self, n=100):
         """Get the latest n log entries"""
         try:
-            with open(self.log_dir / 'app.log', 'r') as f:
-                # Read last n lines
-                lines = f.readlines()[-n:]
-                return [line.strip() for line in lines]
+            with open(self.log_dir / 'app.log', 'rb') as f:
+                # Read backwards from the end until n lines are in, instead of reading the whole file
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                data = b''
+                while position > 0 and data.count(b'\n') <= n:
+                    step = min(LOG_TAIL_BLOCK, position)
+                    position -= step
+                    f.seek(position)
+                    data = f.read(step) + data
+            lines = data.decode('utf-8', errors='replace').splitlines()
+            if position > 0:
+                # The first line is probably cut off
+                lines = lines[1:]
+            return [line.strip() for line in lines[-n:]]
         except Exception as e:
             logger.error(f"Error reading logs: {str(e)}")
             return []
+
+    def version(self) -> Optional[Tuple[int, int]]:
+        """Size and modification time of the log file, which change whenever a line is logged"""
+        try:
+            stat = (self.log_dir / 'app.log').stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
     
     def clear_logs(self):
         """Clear the log file"""
@@ -62,6 +158,14 @@ class FileLogger:
         except Exception as e:
             logger.error(f"Error clearing logs: {str(e)}")
 
+# Discovery API page size (its maximum) and the deepest result it will page to (page * size < 1000)
+TICKETMASTER_PAGE_SIZE = 200
+TICKETMASTER_MAX_RESULTS = 1000
+# Parse result pages incrementally with ijson (when installed) instead of loading each page with response.json()
+TICKETMASTER_STREAMING = os.getenv('TICKETMASTER_STREAMING', '1').lower() in ('1', 'true', 'yes')
+if TICKETMASTER_STREAMING and importlib.util.find_spec('ijson') is None:
+    TICKETMASTER_STREAMING = False
+
 class TicketmasterClient:
     def __init__(self):
         self.api_key = os.getenv('TICKETMASTER_API_KEY')
@@ -69,68 +173,177 @@ class TicketmasterClient:
             logger.error("Missing Ticketmaster API key in environment variables")
             raise ValueError("Ticketmaster API key not found in environment variables")
         self.base_url = "https://app.ticketmaster.com/discovery/v2/events.json"
+        self.session = http_session('ticketmaster')
+        self.streaming = TICKETMASTER_STREAMING
     
-    def search_events(self, artist_name: str, cities: List[str]) -> List[Dict]:
+    def fetch_page(self, params: Dict, deadline: Optional[Deadline] = None) -> Tuple[List[Dict], int]:
+        """Fetches one result page as compact events. Returns (events, total pages)."""
+        if deadline is not None:
+            deadline.check('during the Ticketmaster search')
+        ensure_budget('ticketmaster')
+        if not allow(TICKETMASTER_SOURCE):
+            raise SourceDisabled("Ticketmaster API disabled after repeated failures")
+        record_usage('ticketmaster') # Counted against the quota whether or not it succeeds
+        try:
+            try:
+                with self.session.get(self.base_url, params=params, stream=self.streaming,
+                                      timeout=call_timeout(TICKETMASTER_TIMEOUT, deadline)) as response:
+                    response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+                    if self.streaming:
+                        response.raw.decode_content = True # Let urllib3 undo gzip before parsing
+                        page = stream_events(response.raw)
+                    else:
+                        data = response.json()
+                        events = [compact_event(event) for event in data.get('_embedded', {}).get('events', [])]
+                        page = (events, data.get('page', {}).get('totalPages', 1))
+            except urllib3.exceptions.HTTPError as e:
+                # Reading response.raw raises urllib3's own errors, e.g. a read timeout in the middle of a page
+                raise requests.exceptions.ConnectionError(e) from e
+        except requests.exceptions.RequestException as e:
+            # A rejected query (e.g. 400) says nothing about whether the API is up
+            status = e.response.status_code if e.response is not None else None
+            if counts_as_outage(status):
+                record_failure(TICKETMASTER_SOURCE, str(e))
+            raise
+        record_success(TICKETMASTER_SOURCE)
+        return page
+
+    def fetch_all_pages(self, params: Dict, description: str, deadline: Optional[Deadline] = None) -> List[Dict]:
+        """Follows the Discovery API pagination and returns every event for `params` in compact form."""
+        events = []
+        page = 0
+        while True:
+            page_events, total_pages = self.fetch_page({**params, 'size': TICKETMASTER_PAGE_SIZE, 'page': page}, deadline)
+            # Only a summary: full pages are hundreds of KB each
+            logger.debug(f"Ticketmaster page {page + 1}/{total_pages} for {description}: {len(page_events)} events")
+            events.extend(page_events)
+            page += 1
+            if page >= total_pages:
+                break
+            if (page + 1) * TICKETMASTER_PAGE_SIZE > TICKETMASTER_MAX_RESULTS:
+                # The Discovery API refuses to page past its deep-paging limit
+                logger.warning(f"Ticketmaster results for {description} truncated at {len(events)} events ({total_pages} pages available)")
+                break
+        return events
+
+    def location_queries(self, matcher: LocationMatcher, count_skipped: bool = True) -> List[tuple]:
+        """One (params, description) Ticketmaster location filter per distinct area to search.
+
+        Cities the gazetteer resolved (qualified with their state/province) become a single latlong + radius
+        search, which also covers nearby suburbs and any other tracked city inside that radius. State/province
+        codes use stateCode. Other cities (bare names, cities abroad, places missing from the gazetteer) fall
+        back to an exact city search, narrowed to their country when one was given.
+        """
+        queries = []
+        seen = set()
+        centers = matcher.search_centers()
+        for tracked in matcher.tracked:
+            if tracked.region:
+                location_params = {'stateCode': tracked.region}
+                description = f"state/province {tracked.region}"
+            elif tracked.place:
+                if tracked not in centers or tracked.place.region in matcher.regions:
+                    if count_skipped:
+                        STAGE_CACHE_HITS.inc(stage='ticketmaster') # Already covered by another search
+                    continue
+                location_params = {'latlong': f"{tracked.place.latitude:.4f},{tracked.place.longitude:.4f}",
+                                   'radius': int(matcher.radius_km), 'unit': 'km'}
+                description = f"{int(matcher.radius_km)} km around {tracked.label}"
+            else:
+                location_params = {'city': tracked.city.name}
+                # Only a country the user wrote: a state code the gazetteer didn't resolve may be a country's
+                country = tracked.city.country
+                if tracked.city.region is None and country and len(country) == 2 and country.isupper():
+                    location_params['countryCode'] = country
+                description = f"city {tracked.label}"
+
+            identity = tuple(sorted((k, str(v).lower()) for k, v in location_params.items()))
+            if identity in seen:
+                if count_skipped:
+                    STAGE_CACHE_HITS.inc(stage='ticketmaster') # Duplicate location, already queried
+                continue
+            seen.add(identity)
+            queries.append((location_params, description))
+        return queries
+
+    def estimate_calls(self, artist_name: str, cities: List[str], artist_type: Optional[str] = None,
+                       radius_km: float = DEFAULT_RADIUS_KM) -> int:
+        """Number of API calls search_events is expected to make, from the stored sync state of each query."""
+        classification = CLASSIFICATIONS.get((artist_type or '').lower())
+        matcher = LocationMatcher(cities, radius_km)
+        return sum(estimated_sync_pages(query_key(artist_name, location_params, classification), TICKETMASTER_PAGE_SIZE,
+                                        TICKETMASTER_MAX_RESULTS // TICKETMASTER_PAGE_SIZE)
+                   for location_params, _ in self.location_queries(matcher, count_skipped=False))
+
+    @instrumented('ticketmaster')
+    def search_events(self, artist_name: str, cities: List[str], artist_type: Optional[str] = None,
+                      radius_km: float = DEFAULT_RADIUS_KM, deadline: Optional[Deadline] = None) -> List[TourDate]:
+        """Finds the artist's upcoming events in each location.
+
+        Each (artist, location, classification) query is synced incrementally: a full sync that follows
+        every result page, then only events going on sale since the last sync until the next full sync.
+        Once `deadline` passes, the remaining locations are skipped and the dates found so far returned.
+        """
         tour_dates = []
-        processed_locations = set() # Keep track of locations we've already processed (city or state)
-
-        for location in cities:
-            location = location.strip() # Remove leading/trailing whitespace
-            if not location or location.lower() in processed_locations:
-                continue # Skip empty entries or duplicates
+        classification = CLASSIFICATIONS.get((artist_type or '').lower())
+        matcher = LocationMatcher(cities, radius_km)
 
+        for location_params, search_description in self.location_queries(matcher):
             try:
                 params = {
                     'apikey': self.api_key,
                     'keyword': artist_name,
-                    'size': 100 # Get more results per page if needed
+                    'sort': 'date,asc',
+                    **location_params,
                 }
+                if classification:
+                    # Only ask for the artist's kind of event, which also keeps pages small
+                    params['classificationName'] = classification
+                key = query_key(artist_name, location_params, classification)
+
+                full, start, on_sale_since = sync_window(key)
+                params['startDateTime'] = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+                if on_sale_since is not None:
+                    params['onsaleStartDateTime'] = on_sale_since.strftime('%Y-%m-%dT%H:%M:%SZ')
+                logger.info(f"Searching Ticketmaster for '{artist_name}' in {search_description} "
+                            f"({'full sync' if full else 'events on sale since ' + params['onsaleStartDateTime']})")
+
+                fetched = []
+                try:
+                    fetched = self.fetch_all_pages(params, search_description, deadline)
+                except (requests.exceptions.RequestException, BudgetExhausted, SourceDisabled):
+                    # Keep reporting what the last successful sync found; the watermark is left alone
+                    cached = stored_events(key)
+                    if cached:
+                        logger.warning(f"Using {len(cached)} stored Ticketmaster events for {search_description}")
+                        STAGE_ERRORS.inc(stage='ticketmaster')
+                        events = cached
+                    else:
+                        raise
+                else:
+                    if not full:
+                        STAGE_CACHE_HITS.inc(stage='ticketmaster')
+                    events = store_sync(key, full, start, fetched)
 
-                # Check if the location looks like a state/province code (e.g., 2 letters)
-                # You might want a more robust check depending on the codes you expect (e.g., length, characters)
-                if len(location) == 2 and location.isalpha(): # Check if it's a state/province code
-                    params['stateCode'] = location
-                    search_description = f"state/province {location}"
-                else: # Assume it's a city name
-                    params['city'] = location
-                    search_description = f"city {location}"
-                
-                logger.info(f"Searching Ticketmaster for '{artist_name}' in {search_description}")
-                
-                response = requests.get(self.base_url, params=params)
-                response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-
-                # Log raw response for debugging
-                logger.debug(f"Raw Ticketmaster API response for {search_description}: {response.text}")
-
-                data = response.json()
-
-                # Check if '_embedded' and 'events' exist
-                events = data.get('_embedded', {}).get('events', [])
                 if not events:
-                     logger.info(f"No events found in the '_embedded' structure for {search_description}.")
-                     # Continue to the next location instead of erroring
-                     processed_locations.add(location.lower()) # Mark location as processed even if no events found
+                     logger.info(f"No events found for {search_description}.")
                      continue # Skip to the next city/state
 
-                logger.debug(f"Processing {len(events)} events found for {search_description}.")
+                logger.debug(f"Processing {len(events)} events ({len(fetched)} fetched) for {search_description}.")
 
                 for event in events:
                     event_name = event.get('name', '')
-                    venue_info = event.get('_embedded', {}).get('venues', [{}])[0]
-                    venue_name = venue_info.get('name', 'Venue not specified')
-                    city_name = venue_info.get('city', {}).get('name', '')
-                    state_code = venue_info.get('state', {}).get('stateCode', '')
-                    state_name = venue_info.get('state', {}).get('name', '') # Get full state name too
-                    country_code = venue_info.get('country', {}).get('countryCode', '')
+                    venue_name = event.get('venue', 'Venue not specified')
+                    city_name = event.get('city', '')
+                    state_code = event.get('state_code', '')
+                    state_name = event.get('state_name', '') # Get full state name too
 
                     # --- Normalize names for comparison ---
                     normalized_artist_name = ''.join(c for c in artist_name if c.isalnum() or c.isspace()).lower().strip()
                     normalized_event_name = ''.join(c for c in event_name if c.isalnum() or c.isspace()).lower().strip()
                     
                     # Get the attractions to check if our artist is in the lineup
-                    attractions = event.get('_embedded', {}).get('attractions', [])
-                    attraction_names = [attraction.get('name', '').lower() for attraction in attractions]
+                    attraction_names = [name.lower() for name in event.get('attractions', [])]
                     
                     # Check if artist is in the lineup (either in event name or attractions list)
                     is_artist_match = False
@@ -153,7 +366,7 @@ class TicketmasterClient:
                         display_location = ", ".join(filter(None, display_location_parts)) # Filter out empty parts
 
                         # Date formatting
-                        local_date = event.get('dates', {}).get('start', {}).get('localDate')
+                        local_date = event.get('local_date')
                         
                         if local_date:
                             try:
@@ -167,26 +380,34 @@ class TicketmasterClient:
 
                         ticket_url = event.get('url', '#')
 
-                        tour_dates.append({
-                            'artist': artist_name,
-                            'city': display_location, # Use combined city, state
-                            'venue': venue_name,
-                            'date': formatted_date,
-                            'ticket_url': ticket_url,
-                            'source': 'Ticketmaster',
-                            'source_url': ticket_url
-                        })
+                        tour_dates.append(TourDate(
+                            artist=artist_name,
+                            city=display_location, # Use combined city, state
+                            venue=venue_name,
+                            date=formatted_date,
+                            ticket_url=ticket_url,
+                            source='Ticketmaster',
+                            source_url=ticket_url,
+                        ))
                         logger.debug(f"Found potential date: {venue_name} in {display_location} on {formatted_date}")
                     else: # Log skipped events for debugging
                         logger.debug(f"Skipping event: Name '{event_name}' did not match artist '{artist_name}' - Event name: '{normalized_event_name}', Attractions: {attraction_names}")
 
-                processed_locations.add(location.lower()) # Mark this location as processed
-
+            except DeadlineExceeded as e:
+                logger.warning(f"Stopping Ticketmaster search for '{artist_name}' at {search_description}: {e}")
+                break
+            except (BudgetExhausted, SourceDisabled) as e:
+                STAGE_ERRORS.inc(stage='ticketmaster')
+                logger.warning(f"Skipping Ticketmaster search for '{artist_name}' in {search_description}: {e}")
             except requests.exceptions.RequestException as e:
+                STAGE_ERRORS.inc(stage='ticketmaster')
                 logger.error(f"Error searching Ticketmaster for '{artist_name}' in {search_description}: {e}")
             except ValueError as e:
+                 STAGE_ERRORS.inc(stage='ticketmaster')
                  logger.error(f"Error processing Ticketmaster data for '{artist_name}' in {search_description}: {e}")
             except Exception as e:
+                 STAGE_ERRORS.inc(stage='ticketmaster')
+                 db.session.rollback()
                  logger.error(f"An unexpected error occurred during Ticketmaster search for {artist_name} in {search_description}: {e}")
 
 
@@ -196,11 +417,12 @@ class TicketmasterClient:
         for date in tour_dates:
             # Create a unique key for each event instance
             # Using city in the key ensures events in different cities aren't marked as duplicates
-            date_key = (date['venue'].lower(), date['date'], date['city'].lower())
+            date_key = (date.venue.lower(), date.date, date.city.lower())
             if date_key not in seen_dates:
                 unique_dates.append(date)
                 seen_dates.add(date_key)
         
+        STAGE_DATES_FOUND.inc(len(unique_dates), stage='ticketmaster')
         logger.info(f"Found {len(unique_dates)} unique potential dates for '{artist_name}' via Ticketmaster across specified locations.")
         return unique_dates
 
@@ -223,11 +445,33 @@ class TelegramNotifier:
         """Checks if both bot token and chat ID are configured."""
         return bool(self.bot_token and self.chat_id)
 
-    def send_message(self, message: str) -> bool:
-        """Sends a message via the Telegram Bot API."""
+    def send_message(self, message: str, key: Optional[str] = None) -> bool:
+        """Queues a message in the outbox for the background sender and returns without waiting for Telegram.
+
+        `key` is an idempotency key: a message whose key is already in the outbox isn't queued again.
+        """
         if not self.is_configured():
             logger.error("Telegram is not configured. Cannot send message.")
+            STAGE_ERRORS.inc(stage='telegram')
             return False
+        try:
+            enqueue_message(message, key)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue Telegram message: {e}")
+            db.session.rollback()
+            STAGE_ERRORS.inc(stage='telegram')
+            return False
+
+    @instrumented('telegram')
+    def deliver(self, message: str) -> Dict:
+        """Sends a message via the Telegram Bot API. Called by the outbox sender.
+
+        Returns {'ok': True, 'message_id': ...} or {'ok': False, 'error': ..., 'retry_after': ..., 'permanent': ...}.
+        """
+        if not self.is_configured():
+            STAGE_ERRORS.inc(stage='telegram')
+            return {'ok': False, 'error': 'Telegram is not configured', 'permanent': True}
 
         url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
         payload = {
@@ -242,38 +486,44 @@ class TelegramNotifier:
         # logger.debug(f"Message content: {message}") 
         
         try:
-            response = requests.post(url, json=payload, timeout=10) # Add timeout
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            
+            response = http_session('telegram').post(url, json=payload, timeout=10) # Add timeout
+            try:
+                response_data = response.json()
+            except ValueError:
+                response_data = {}
+
             # Check response content for success
-            response_data = response.json()
-            if response_data.get('ok'):
+            if response.ok and response_data.get('ok'):
                  logger.info("Telegram message sent successfully.")
-                 return True
-            else:
-                 error_desc = response_data.get('description', 'Unknown error')
-                 logger.error(f"Telegram API returned error: {error_desc}")
-                 return False
+                 return {'ok': True, 'message_id': (response_data.get('result') or {}).get('message_id')}
+
+            error_desc = response_data.get('description') or f"HTTP {response.status_code}"
+            logger.error(f"Telegram API returned error: {error_desc}")
+            STAGE_ERRORS.inc(stage='telegram')
+            retry_after = (response_data.get('parameters') or {}).get('retry_after')
+            if response.status_code == 429 or retry_after:
+                return {'ok': False, 'error': error_desc, 'retry_after': retry_after or 30}
+            # Other 4xx errors (bad chat id, invalid HTML, revoked token) won't succeed on a retry
+            return {'ok': False, 'error': error_desc, 'permanent': 400 <= response.status_code < 500}
 
         except requests.exceptions.Timeout:
             logger.error("Request to Telegram API timed out.")
-            return False
+            STAGE_ERRORS.inc(stage='telegram')
+            return {'ok': False, 'error': 'Request to Telegram API timed out'}
         except requests.exceptions.RequestException as e:
             logger.error(f"Error sending Telegram message: {e}")
-            # Log response content if available and request failed
-            if e.response is not None:
-                logger.error(f"Telegram API Response Status: {e.response.status_code}")
-                try:
-                    logger.error(f"Telegram API Response Body: {e.response.text}")
-                except Exception:
-                    logger.error("Could not read Telegram API response body.")
-            return False
+            STAGE_ERRORS.inc(stage='telegram')
+            return {'ok': False, 'error': str(e)}
         except Exception as e:
             logger.error(f"An unexpected error occurred sending Telegram message: {e}")
-            return False
+            STAGE_ERRORS.inc(stage='telegram')
+            return {'ok': False, 'error': str(e)}
 
-    def send_tour_dates(self, artist_name: str, tour_dates: List[Dict]) -> bool:
-        """Safely sends tour dates grouped by city, chunked to respect Telegram limits with valid HTML."""
+    def send_tour_dates(self, artist_name: str, tour_dates: List[TourDate], key: Optional[str] = None) -> bool:
+        """Safely sends tour dates grouped by city, chunked to respect Telegram limits with valid HTML.
+
+        Each chunk is queued with the idempotency key `<key>:<n>` when `key` is given.
+        """
         if not self.is_configured():
             logger.warning("Telegram is not configured. Skipping send_tour_dates.")
             return False
@@ -285,29 +535,29 @@ class TelegramNotifier:
 
         # Build sources block (only included in first chunk)
         source_urls = sorted(list(set(
-            d.get('source_url') for d in tour_dates if d.get('source_url')
+            d.source_url for d in tour_dates if d.source_url
         )))
         sources_block = ""
         if source_urls:
             sources_block += "🔍 <b>Source(s):</b>\n"
             for url in source_urls:
                 # Determine label from first matching date
-                first_date_for_url = next((d for d in tour_dates if d.get('source_url') == url), None)
-                source_type = first_date_for_url.get('source', 'Unknown') if first_date_for_url else 'Unknown'
+                first_date_for_url = next((d for d in tour_dates if d.source_url == url), None)
+                source_type = (first_date_for_url.source or 'Unknown') if first_date_for_url else 'Unknown'
                 label = "Ticketmaster Event Page" if source_type == "Ticketmaster" else url
                 # Ensure quotes are balanced in HTML
                 sources_block += f"• <a href=\"{url}\">{label}</a> ({source_type})\n"
             sources_block += "\n"
 
         # Group dates by city and create city sections. Split large cities by event count.
-        dates_by_city: Dict[str, List[Dict]] = {}
+        dates_by_city: Dict[str, List[TourDate]] = {}
         for d in tour_dates:
-            city = d.get('city', 'Unknown City')
+            city = d.city or 'Unknown City'
             dates_by_city.setdefault(city, []).append(d)
 
         city_sections: List[str] = []
         for city in sorted(dates_by_city.keys()):
-            city_events = sorted(dates_by_city[city], key=lambda x: x.get('date', ''))
+            city_events = sorted(dates_by_city[city], key=lambda x: x.date or '')
 
             # Split events into chunks to avoid a single city section growing too large
             for idx in range(0, len(city_events), self.MAX_EVENTS_PER_CITY_SECTION):
@@ -315,9 +565,9 @@ class TelegramNotifier:
                 city_header = f"📍 <b>{city}</b>\n" if idx == 0 else f"📍 <b>{city} (cont.)</b>\n"
                 section_parts: List[str] = [city_header]
                 for date_info in sub_events:
-                    venue = date_info.get('venue', 'Unknown Venue')
-                    date_str = date_info.get('date', 'Unknown Date')
-                    ticket_url = date_info.get('ticket_url', '#')
+                    venue = date_info.venue or 'Unknown Venue'
+                    date_str = date_info.date or 'Unknown Date'
+                    ticket_url = date_info.ticket_url or '#'
                     section_parts.append(f"  • {venue}\n")
                     section_parts.append(f"    📅 {date_str}\n")
                     if ticket_url != '#':
@@ -359,7 +609,7 @@ class TelegramNotifier:
 
         all_ok = True
         for i, msg in enumerate(safe_messages, start=1):
-            ok = self.send_message(msg)
+            ok = self.send_message(msg, f"{key}:{i}" if key else None)
             if not ok:
                 all_ok = False
         return all_ok
@@ -380,52 +630,211 @@ class TelegramNotifier:
         logger.info(f"Sending scraping error notification for {artist_name} - URL: {url}")
         return self.send_message(message)
 
+def send_disabled_alerts(notifier: TelegramNotifier):
+    """Queues one "source disabled" alert for each source whose circuit breaker opened since the last call."""
+    try:
+        for message, key in claim_alerts():
+            notifier.send_message(message, key)
+    except Exception as e:
+        logger.error(f"Failed to queue source disabled alerts: {e}")
+        db.session.rollback()
+
 class TourScraper:
-    def __init__(self):
-        self.settings = Settings.get_settings()
+    def __init__(self, match_radius_km: Optional[int] = None):
+        # Clients come from the process-wide registry on first use, so creating a scraper is cheap
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
-        # Configure Gemini
-        if self.gemini_api_key:
-             genai.configure(api_key=self.gemini_api_key)
-             # Change the model name back to 'gemini-2.0-flash-latest'
-             self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
-             logger.info("Gemini configured successfully with gemini-2.0-flash-lite.")
-        else:
+        if not self.gemini_api_key:
              logger.warning("GEMINI_API_KEY not found. LLM processing will be skipped.")
-             self.model = None # Set model to None if not configured
-
-        # Store the Firecrawl API key as an attribute
         self.firecrawl_api_key = os.getenv('FIRECRAWL_API_KEY')
-        if self.firecrawl_api_key:
-            self.firecrawl = FirecrawlApp(api_key=self.firecrawl_api_key)
-            logger.info("Firecrawl configured successfully.")
-        else:
+        if not self.firecrawl_api_key:
             logger.warning("FIRECRAWL_API_KEY not found. Web scraping will be skipped.")
-            self.firecrawl = None # Set firecrawl client to None if not configured
-
-        self.ticketmaster = None
+        self.ticketmaster_api_key = os.getenv('TICKETMASTER_API_KEY')
+        if not self.ticketmaster_api_key:
+            logger.warning("TICKETMASTER_API_KEY not found. Ticketmaster checks will be skipped.")
+        self._match_radius_km = match_radius_km
+
+        # Pages scraped during this scraper's lifetime (one run), keyed by normalized URL.
+        # Values are futures so a page requested while its scrape is in flight is only fetched once.
+        self._page_cache: Dict[str, Future] = {}
+        self._page_cache_lock = threading.Lock()
+        self._scrape_pool: Optional[ThreadPoolExecutor] = None
+        self._scrape_started: Dict[str, float] = {}  # normalized URL -> when its scrape left the queue
+        # Runs the chunk requests of map-reduce extractions, LLM_MAP_CONCURRENCY at a time across the run
+        self._llm_pool: Optional[ThreadPoolExecutor] = None
+        self.last_scrape_started: Optional[float] = None
+        self.last_scrape_finished: Optional[float] = None
+
+    def _timed_scrape(self, url: str) -> Dict:
+        """Runs in a scrape pool worker. The Firecrawl call itself runs in a thread of its own, so a call that
+        hangs frees the worker for the next URL: the request timeout firecrawl-py sets comes out in hours
+        (see scrape_url), so this wait is what keeps a hung scrape to FIRECRAWL_TIMEOUT."""
+        start = time.perf_counter()
+        key = normalize_url(url)
+        self._scrape_started[key] = start
+        self.last_scrape_started = start
+        source = url_source(key)
+        if not allow(source):
+            logger.info(f"Skipping {url}: disabled after repeated failures")
+            return {"success": False, "url": url, "content": None, "disabled": True, "elapsed": 0.0,
+                    "error": "Source disabled after repeated failures"}
+        call: Future = Future()
+        threading.Thread(target=self._scrape_and_record, args=(url, source, call),
+                         name='scrape-call', daemon=True).start()
+        try:
+            result = call.result(timeout=FIRECRAWL_TIMEOUT + SCRAPE_WAIT_GRACE)
+        except FutureTimeout:
+            # Left to finish in its thread, which records its outcome on the breakers when it does
+            STAGE_ERRORS.inc(stage='scrape')
+            logger.error(f"Scrape of {url} timed out after {FIRECRAWL_TIMEOUT:g}s")
+            result = {"success": False, "url": url, "content": None, "timed_out": True,
+                      "error": f"Firecrawl scrape timed out after {FIRECRAWL_TIMEOUT:g}s"}
+        self.last_scrape_finished = time.perf_counter()
+        result["elapsed"] = self.last_scrape_finished - start
+        return result
+
+    def _scrape_and_record(self, url: str, source: str, call: Future):
         try:
-            # TicketmasterClient already handles its own key check
-            self.ticketmaster = TicketmasterClient()
-            logger.info("Ticketmaster client initialized.")
-        except ValueError:
-            logger.warning("Ticketmaster client initialization failed (API key likely missing). Ticketmaster checks will be skipped.")
+            result = self.scrape_url(url)
         except Exception as e:
-             logger.error(f"Unexpected error initializing TicketmasterClient: {e}", exc_info=True)
-             self.ticketmaster = None # Ensure it's None on other init errors
-
+            logger.error(f"Exception during scrape of {url}: {e}", exc_info=True)
+            result = {"success": False, "url": url, "content": None, "error": f"Exception during scrape: {str(e)}"}
+        if result.get("success"):
+            record_success(source)
+        elif not result.get("skipped"):
+            result["disabled"] = record_failure(source, result.get("error") or "Unknown scraping error")
+        call.set_result(result)
+
+    def prefetch_urls(self, urls: List[str], wait: bool = True, deadline: Optional[Deadline] = None) -> Dict[str, Dict]:
+        """Scrapes each unique URL once, up to SCRAPE_CONCURRENCY at a time, and returns {url: result}.
+
+        Pages already requested from this scraper (e.g. a lineup page shared by several artists) are
+        served from the cache, so a run-wide prefetch delivers each page to every artist that references it.
+        With wait=False the scrapes are only started and an empty dict is returned.
+        Scrapes that overrun FIRECRAWL_TIMEOUT or `deadline` are returned as timed out.
+        """
+        futures = {}
+        with self._page_cache_lock:
+            for url in urls:
+                key = normalize_url(url)
+                if key in self._page_cache:
+                    if url not in futures:
+                        STAGE_CACHE_HITS.inc(stage='scrape')
+                else:
+                    if self._scrape_pool is None:
+                        self._scrape_pool = ThreadPoolExecutor(max_workers=max(1, SCRAPE_CONCURRENCY),
+                                                               thread_name_prefix='scrape')
+                    self._page_cache[key] = self._scrape_pool.submit(self._timed_scrape, url)
+                futures[url] = self._page_cache[key]
+
+        if not wait:
+            return {}
+        return {url: self._wait_for_scrape(url, future, deadline) for url, future in futures.items()}
+
+    def _wait_for_scrape(self, url: str, future: Future, deadline: Optional[Deadline]) -> Dict:
+        """The scrape's result, or a timed out one.
+
+        Workers give up on a scrape after FIRECRAWL_TIMEOUT, so the queue keeps moving and time spent queued
+        only counts against `deadline`. Without one, a scrape still queued after FIRECRAWL_TIMEOUT in which no
+        other scrape started or finished is given up as well.
+        """
+        key = normalize_url(url)
+        progress = time.perf_counter()
+        while True:
+            started = self._scrape_started.get(key)
+            if started is None:
+                # Still queued; look again once it may have started
+                wait = 1.0
+            else:
+                wait = max(started + FIRECRAWL_TIMEOUT + SCRAPE_WAIT_GRACE * 2 - time.perf_counter(), 0.0)
+            try:
+                return future.result(timeout=call_timeout(wait, deadline))
+            except FutureTimeout:
+                if deadline is not None and deadline.overdue('during scraping'):
+                    return {"success": False, "url": url, "content": None, "timed_out": True, "deadline": True,
+                            "elapsed": time.perf_counter() - started if started else 0.0, "error": deadline.missed}
+                if started is not None:
+                    # Only if the worker itself got stuck: it normally answers by FIRECRAWL_TIMEOUT
+                    STAGE_ERRORS.inc(stage='scrape')
+                    logger.error(f"Scrape of {url} timed out after {FIRECRAWL_TIMEOUT:g}s")
+                    return {"success": False, "url": url, "content": None, "timed_out": True,
+                            "elapsed": time.perf_counter() - started,
+                            "error": f"Firecrawl scrape timed out after {FIRECRAWL_TIMEOUT:g}s"}
+                progress = max(progress, self.last_scrape_started or 0.0, self.last_scrape_finished or 0.0)
+                if time.perf_counter() - progress > FIRECRAWL_TIMEOUT + SCRAPE_WAIT_GRACE:
+                    STAGE_ERRORS.inc(stage='scrape')
+                    logger.error(f"Scrape of {url} never left the queue")
+                    return {"success": False, "url": url, "content": None, "timed_out": True, "elapsed": 0.0,
+                            "error": f"Firecrawl scrape queued for over {FIRECRAWL_TIMEOUT:g}s without progress"}
+
+    def is_prefetched(self, url: str) -> bool:
+        with self._page_cache_lock:
+            return normalize_url(url) in self._page_cache
+
+    def close(self):
+        """Stops the scrape and LLM worker threads once the run is over."""
+        if self._scrape_pool is not None:
+            self._scrape_pool.shutdown(wait=False, cancel_futures=True)
+            self._scrape_pool = None
+        if self._llm_pool is not None:
+            self._llm_pool.shutdown(wait=False, cancel_futures=True)
+            self._llm_pool = None
+
+    @property
+    def model(self):
+        return gemini_model(self.gemini_api_key)
+
+    @property
+    def firecrawl(self):
+        return firecrawl_app(self.firecrawl_api_key)
+
+    @property
+    def ticketmaster(self) -> Optional[TicketmasterClient]:
+        if not self.ticketmaster_api_key:
+            return None
+        return client_registry.get('ticketmaster', self.ticketmaster_api_key, TicketmasterClient)
+
+    @property
+    def match_radius_km(self) -> int:
+        if self._match_radius_km is None:
+            self._match_radius_km = cached_settings().match_radius_km or DEFAULT_RADIUS_KM
+        return self._match_radius_km
+
+    @instrumented('scrape')
     def scrape_url(self, url: str) -> Dict:
         """Scrapes a single URL using Firecrawl."""
         result = {"success": False, "url": url, "content": None, "error": None}
         if not self.firecrawl:
             result["error"] = "Firecrawl client not configured (FIRECRAWL_API_KEY missing?)"
+            result["skipped"] = True # Not the page's fault
             logger.warning(result["error"])
+            STAGE_ERRORS.inc(stage='scrape')
+            return result
+
+        try:
+            ensure_budget('firecrawl')
+        except BudgetExhausted as e:
+            result["error"] = f"Not scraped: Firecrawl {e}"
+            result["skipped"] = True
+            logger.warning(f"{result['error']} for url: {url}")
+            STAGE_ERRORS.inc(stage='scrape')
+            return result
+        if not allow(FIRECRAWL_SOURCE):
+            # Reported once, by the "source disabled" alert of Firecrawl itself
+            result["error"] = "Not scraped: Firecrawl API disabled after repeated failures"
+            result["skipped"] = True
+            result["disabled"] = True
+            logger.warning(f"{result['error']} for url: {url}")
             return result
 
         try:
             logger.info(f"Using Firecrawl to scrape: {url}")
             # Make the API call (removed problematic params)
-            scraped_data = self.firecrawl.scrape_url(url=url)
+            record_usage('firecrawl')
+            # Firecrawl stops loading the page after `timeout` ms. firecrawl-py 1.13.5 also gives the request a
+            # timeout, meant as timeout/1000 + 5 s, but passes `timeout + 5000` to requests, which reads seconds
+            # (65000 s here). What bounds the call is _timed_scrape's wait of FIRECRAWL_TIMEOUT + SCRAPE_WAIT_GRACE
+            scraped_data = self.firecrawl.scrape_url(url=url, params={'timeout': int(FIRECRAWL_TIMEOUT * 1000)})
+            record_success(FIRECRAWL_SOURCE)
 
             # Check if the scrape was successful AND if we got the markdown content
             if scraped_data and scraped_data.get('markdown'): # <-- Check for 'markdown' key
@@ -437,249 +846,616 @@ class TourScraper:
                 # Log the structure if the check failed despite 200 OK
                 logger.error(f"Firecrawl scrape check failed for url: {url}. Response: {scraped_data}")
                 result["error"] = "Firecrawl scrape failed: Response missing expected 'markdown' data."
+                STAGE_ERRORS.inc(stage='scrape')
                 return result
 
-        except requests.exceptions.HTTPError as e:
+        except requests.exceptions.RequestException as e:
             # Specific handling for HTTP errors from Firecrawl
             result["error"] = f"Firecrawl API request failed: {str(e)}"
             logger.error(f"{result['error']} for url: {url}")
+            STAGE_ERRORS.inc(stage='scrape')
+            status = e.response.status_code if e.response is not None else None
+            # Only a bad key, no credits, rate limiting or an unreachable API are clearly Firecrawl's fault.
+            # Firecrawl also answers 5xx when the page itself can't be scraped, so those count against the URL
+            if status in FIRECRAWL_OUTAGE_STATUSES or isinstance(e, (requests.exceptions.ConnectionError,
+                                                                     requests.exceptions.Timeout)):
+                result["skipped"] = True
+                result["disabled"] = record_failure(FIRECRAWL_SOURCE, str(e))
+            elif status is not None and status < 500:
+                record_success(FIRECRAWL_SOURCE)
             return result
         except Exception as e:
             # Catch other exceptions during the scrape call
             result["error"] = f"Exception during Firecrawl scrape: {str(e)}"
             logger.error(f"{result['error']} for url: {url}", exc_info=True)
+            STAGE_ERRORS.inc(stage='scrape')
             return result
 
-    def process_with_llm(self, scraped_data: Dict, artist: Artist) -> List[Dict]:
-        """Processes scraped data with the LLM to find tour dates."""
+    @instrumented('llm')
+    def process_batch_with_llm(self, sources: List[ExtractionSource], record: Optional[ArtistCheck] = None,
+                               timeout: float = GEMINI_TIMEOUT) -> Dict[int, List[Dict]]:
+        """Extracts tour dates from several scraped pages in one schema-constrained Gemini request.
+
+        Returns {source_id: [dates]} so every date can be attributed to the page it came from.
+        The request is abandoned after `timeout` seconds.
+        """
         # Explicitly check if the model was initialized
         if not self.model:
              logger.error("Gemini model not initialized (likely missing API key). Cannot process with LLM.")
-             # Returning [] here will cause the calling function (check_artist)
-             # to log an error and add it to the scrape_error_messages for notification.
-             # We can make the error more specific by raising it here.
              raise ValueError("Gemini model not initialized (API key likely missing)")
 
-        # Extract the raw list of locations the user entered
-        user_locations = [loc.strip() for loc in artist.cities.split(',') if loc.strip()]
-        locations_string = ", ".join(user_locations) # e.g., "New York, Los Angeles, CA, BC"
-
-        prompt = f"""
-        Analyze the following text scraped from {scraped_data['url']} for the artist "{artist.name}".
-
-        The user is tracking tour dates based on this list of locations: {locations_string}.
-        This list may contain specific city names (e.g., "Los Angeles") or 2-letter state/province codes (e.g., "CA", "BC").
-
-        Your task is to extract all tour dates mentioned in the text that match EITHER:
-        1. A specific city name listed by the user. Or state/province code (If Vancouver is listed, it will be Vancouver, BC, Canada NOT Vancouver, WA, USA) (Ignore if city is Salmo, BC, Canada)
-        2. Any city located within a state or province code listed by the user.
-        3. Optionally, if the text explicitly mentions an event in a city immediately surrounding one of the user's specified cities, within the same Country, State, or Province (e.g., Anaheim near Los Angeles), include that too. Only include these nearby cities if clearly stated on the page.
-
-        For each valid tour date found according to these rules, provide the following information in JSON format: city (including state/province, e.g., "Los Angeles, CA"), venue, date (YYYY-MM-DD), and ticket_url (if available, otherwise use '#').
-
-        If no relevant tour dates are found based on the user's location list and the surrounding city rule, return an empty JSON array `[]`.
-
-        Scraped text:
-        ```markdown
-        {scraped_data['content']}
-        ```
-
-        Respond ONLY with the JSON array.
-        """
-
+        ensure_budget('gemini')
+        if not allow(GEMINI_SOURCE):
+            raise SourceDisabled("Gemini API disabled after repeated failures")
+        prompt = build_prompt(sources)
+        prompt_bytes = len(prompt.encode('utf-8'))
+        LLM_PROMPT_BYTES.observe(prompt_bytes)
+        if record is not None:
+            record.llm_bytes_sent = (record.llm_bytes_sent or 0) + prompt_bytes
+
+        artist_names = sorted({source.artist_name for source in sources})
+        logger.info(f"Sending {len(sources)} source(s) for {', '.join(artist_names)} to Gemini in one request (~{estimate_tokens(prompt)} tokens)")
         try:
-            logger.info(f"Sending request to Gemini for {artist.name} based on locations: {locations_string}")
-            response = self.model.generate_content(prompt)
-
-            # Clean the response: remove backticks and 'json' identifier
-            cleaned_response = response.text.strip().removeprefix('```json').removesuffix('```').strip()
-            logger.info(f"Raw LLM Response for {artist.name}: {cleaned_response}") # Log cleaned response
-
-            # Attempt to parse the cleaned JSON response
-            try:
-                tour_dates = json.loads(cleaned_response)
-                # Basic validation: ensure it's a list
-                if not isinstance(tour_dates, list):
-                    logger.error(f"LLM response for {artist.name} was not a JSON list: {cleaned_response}")
-                    return []
-
-                # Further validation: ensure items are dicts with expected keys (optional but good)
-                validated_dates = []
-                for item in tour_dates:
-                    if isinstance(item, dict) and 'city' in item and 'venue' in item and 'date' in item:
-                        # Ensure ticket_url exists, defaulting to '#'
-                        item['ticket_url'] = item.get('ticket_url', '#')
-                        validated_dates.append(item)
-                    else:
-                        logger.warning(f"Skipping invalid item in LLM response for {artist.name}: {item}")
-                
-                logger.info(f"Successfully parsed {len(validated_dates)} tour dates for {artist.name} from LLM.")
-                return validated_dates
-
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse LLM JSON response for {artist.name}: {e}")
-                logger.error(f"Raw content that failed parsing: {cleaned_response}")
-                return []
-            except Exception as e:
-                logger.error(f"Unexpected error parsing LLM response for {artist.name}: {e}")
-                return []
-
-        except ValueError as ve: # Catch the specific error we raised
-             logger.error(f"Skipping LLM for {artist.name}: {ve}")
-             raise # Re-raise the error so check_artist catches it properly
+            response = self.model.generate_content(prompt, generation_config={
+                'response_mime_type': 'application/json',
+                'response_schema': ExtractionResult,
+            }, request_options={'timeout': timeout})
         except Exception as e:
-             logger.error(f"Failed to generate content with LLM for {artist.name}: {str(e)}")
+             record_usage('gemini', tokens=estimate_tokens(prompt)) # Assume the prompt was billed
+             status = getattr(e, 'code', None) # HTTP status on google.api_core errors
+             if counts_as_outage(status if isinstance(status, int) else None):
+                 record_failure(GEMINI_SOURCE, str(e))
+             logger.error(f"Failed to generate content with LLM for {', '.join(artist_names)}: {str(e)}")
              # Log specific Gemini API errors if possible
              if hasattr(e, 'response'):
                   logger.error(f"Gemini API Error Details: {e.response}")
-             # Raise the exception so check_artist catches it and adds to scrape_error_messages
-             raise # Re-raise the original exception
-
-    def check_artist(self, artist: Artist, notifier: TelegramNotifier) -> List[Dict]:
+             raise # Re-raise so check_artist reports it for every source in the batch
+
+        record_success(GEMINI_SOURCE)
+        usage = getattr(response, 'usage_metadata', None)
+        record_usage('gemini', tokens=getattr(usage, 'total_token_count', None)
+                     or estimate_tokens(prompt) + estimate_tokens(response.text))
+        LLM_RESPONSE_BYTES.observe(len(response.text.encode('utf-8')))
+        logger.debug(f"Raw LLM Response: {response.text}")
+
+        results = parse_response(response.text, sources)
+        found = sum(len(dates) for dates in results.values())
+        STAGE_DATES_FOUND.inc(found, stage='llm')
+        logger.info(f"Successfully parsed {found} tour dates from {len(sources)} source(s) via LLM.")
+        return results
+
+    def extract_batch(self, batch: List[ExtractionSource], deadline: Optional[Deadline] = None) -> BatchOutcome:
+        """Runs one extraction request, returning its dates or the error it failed with instead of raising."""
+        if deadline is not None and deadline.overdue('during LLM extraction'):
+            return BatchOutcome(error=DeadlineExceeded(deadline.missed))
+        stats = CheckStats() # Per request, so concurrent chunks don't share a counter
+        start = time.perf_counter()
+        try:
+            results = self.process_batch_with_llm(batch, stats, call_timeout(GEMINI_TIMEOUT, deadline))
+        except Exception as e:
+            return BatchOutcome(error=e, seconds=time.perf_counter() - start, prompt_bytes=stats.llm_bytes_sent)
+        return BatchOutcome(results=results, seconds=time.perf_counter() - start, prompt_bytes=stats.llm_bytes_sent)
+
+    def extract_chunks(self, sources: List[ExtractionSource],
+                       deadline: Optional[Deadline] = None) -> Tuple[List[List[ExtractionSource]], List[BatchOutcome]]:
+        """Map step of map-reduce extraction: splits one large page's sections into overlapping chunks and
+        extracts them concurrently. Returns the chunks and their outcomes, in page order."""
+        chunks = split_chunks(sources)
+        with self._page_cache_lock:
+            if self._llm_pool is None:
+                self._llm_pool = ThreadPoolExecutor(max_workers=max(1, LLM_MAP_CONCURRENCY), thread_name_prefix='llm-map')
+            pool = self._llm_pool
+        futures = [pool.submit(self.extract_batch, chunk, deadline) for chunk in chunks]
+        return chunks, [future.result() for future in futures]
+
+    def estimate_usage(self, artist, planned_urls: Set[str]) -> CheckEstimate:
+        """Expected Ticketmaster calls, Firecrawl scrapes and Gemini tokens of checking `artist`.
+
+        Pages in `planned_urls` are already scraped for another artist of the run and cost nothing extra.
+        Gemini usage is taken from the artist's recent checks, which only send new or changed sections.
+        """
+        estimate = CheckEstimate()
+        cities = [city.strip() for city in artist.cities.split(',') if city.strip()]
+        if artist.use_ticketmaster and self.ticketmaster:
+            estimate.costs['ticketmaster'] = self.ticketmaster.estimate_calls(artist.name, cities, artist.artist_type,
+                                                                              self.match_radius_km)
+        urls = artist_urls(artist)
+        estimate.urls = {normalize_url(url) for url in urls}
+        if urls and self.firecrawl_api_key:
+            estimate.costs['firecrawl'] = len(estimate.urls - planned_urls)
+            if self.gemini_api_key:
+                llm_bytes = recent_llm_bytes(artist.id)
+                estimate.costs['gemini'] = (int(llm_bytes) // CHARS_PER_TOKEN if llm_bytes is not None
+                                            else PLANNER_TOKENS_PER_URL * len(urls))
+        return estimate
+
+    def check_artist(self, artist: Artist, notifier: TelegramNotifier, record: Optional[ArtistCheck] = None,
+                     deadline: Optional[Deadline] = None) -> List[TourDate]:
+        """Checks all sources for an artist. If `record` is given, stage timings and counts are written to it.
+
+        Sources not checked by `deadline` (by default ARTIST_DEADLINE_SECONDS from now) are skipped and the
+        check is cut short; `deadline.missed` then says where it stopped.
+        """
         logger.info(f"Starting check for artist: {artist.name}")
         
         if artist.on_hold:
             logger.info(f"Skipping {artist.name} - on hold")
             return []
 
-        all_found_dates = [] # Store results from all sources here
-        cities = [city.strip() for city in artist.cities.split(',') if city.strip()]
-        scrape_error_messages = []
+        # Stats are collected off the session, like in the pipeline: a dirty `record` would be flushed by the
+        # first query and hold SQLite's write lock, blocking usage and breaker updates from scrape and LLM threads
+        job = CheckJob(artist=artist, record=CheckStats() if record is not None else None, started=True,
+                       deadline=deadline or Deadline(ARTIST_DEADLINE_SECONDS, 'artist'))
+        self.fetch_sources(job)
+        self.extract_dates(job)
+        self.finalize_check(job)
+        if record is not None:
+            job.record.apply_to(record)
+        if job.error_notification:
+            # Queue the error notification right away
+            run_id = getattr(record, 'run_id', None)
+            notifier.send_message(job.error_notification, f"run{run_id}:artist{artist.id}:errors" if run_id else None)
+        send_disabled_alerts(notifier)
+        return job.unique_dates
+
+    def fetch_sources(self, job: 'CheckJob'):
+        """Fetch stage: queries Ticketmaster, scrapes the artist's URLs and diffs them against the last snapshots."""
+        artist, record = job.artist, job.record
+        job.cities = [city.strip() for city in artist.cities.split(',') if city.strip()]
         
         # 1. Check Ticketmaster if enabled
         if artist.use_ticketmaster and self.ticketmaster:
             try:
                 logger.info(f"Checking Ticketmaster for {artist.name}")
-                tm_dates = self.ticketmaster.search_events(artist.name, cities)
+                with stage_timer(record, 'ticketmaster_seconds'):
+                    tm_dates = self.ticketmaster.search_events(artist.name, job.cities, artist.artist_type,
+                                                               self.match_radius_km, job.deadline)
                 logger.info(f"Found {len(tm_dates)} dates on Ticketmaster for {artist.name}")
-                all_found_dates.extend(tm_dates) # Add Ticketmaster results
+                job.found_dates.extend(tm_dates) # Add Ticketmaster results
             except Exception as e:
                 error_msg = f"Error checking Ticketmaster API: {str(e)}"
                 logger.error(f"{error_msg} for {artist.name}")
-                scrape_error_messages.append(f"• Ticketmaster API: {str(e)}") # Add formatted error
+                job.error_messages.append(f"• Ticketmaster API: {str(e)}") # Add formatted error
 
         # 2. Check URLs if provided (regardless of Ticketmaster results)
-        if artist.urls: # Check if the urls field is not empty
-             urls = [url.strip() for url in artist.urls.split(',') if url.strip()]
-             if urls: # Proceed only if there are actual URLs after stripping/splitting
-                logger.info(f"Checking URLs for {artist.name}: {urls}")
+        job.urls = artist_urls(artist)
+        if not job.urls:
+            return
+        logger.info(f"Checking URLs for {artist.name}: {job.urls}")
+
+        # Scrape all URLs concurrently; pages prefetched for this run are reused
+        prefetched = {url for url in job.urls if self.is_prefetched(url)}
+        with stage_timer(record, 'scrape_seconds'):
+            pages = self.prefetch_urls(job.urls, deadline=job.deadline)
+
+        # Per-URL timing so slow sources can be identified in the run history
+        for url in job.urls:
+            timing = {'url': url, 'scrape_seconds': 0.0, 'llm_seconds': 0.0,
+                      'llm_bytes_sent': 0, 'dates_found': 0, 'error': None}
+            job.timings[url] = timing
+            try:
+                scraped_result = pages[url]
+                timing['scrape_seconds'] = scraped_result.get('elapsed', 0.0)
+                timing['prefetched'] = url in prefetched
                 
-                for url in urls:
-                    try:
-                        logger.info(f"Scraping URL: {url}")
-                        scraped_result = self.scrape_url(url)
-                        
-                        if scraped_result.get("success") and scraped_result.get("content"):
-                            # Scrape successful, proceed to LLM
-                            try:
-                                logger.info(f"Sending scraped data from {url} to LLM for {artist.name}...")
-                                # Pass the whole result dict for context if needed, or just content
-                                llm_dates = self.process_with_llm(scraped_result, artist)
-                                logger.info(f"LLM processing complete for {artist.name}. Found {len(llm_dates)} dates from {url}")
-                                for date in llm_dates:
-                                    date['source_url'] = url
-                                    date['source'] = 'Web Scrape/LLM'
-                                all_found_dates.extend(llm_dates)
-                            except Exception as e:
-                                # Catch errors specifically during LLM processing for this URL
-                                error_msg = f"Error processing LLM for {url}: {str(e)}"
-                                logger.error(f"{error_msg} for {artist.name}", exc_info=True)
-                                scrape_error_messages.append(f"• {url}: LLM Processing Failed - {str(e)}")
-                        else:
-                            # Scrape failed or returned no content, add specific error from scrape_url
-                            error_msg = scraped_result.get("error", "Unknown scraping error")
-                            logger.warning(f"Failed to get usable content from {url} for {artist.name}: {error_msg}")
-                            scrape_error_messages.append(f"• {url}: {error_msg}")
+                if scraped_result.get("success") and scraped_result.get("content"):
+                    # Scrape successful, queue only new or changed sections for LLM extraction
+                    plan = plan_extraction(artist.id, url, scraped_result["content"])
+                    job.plans[url] = plan
+                    if plan.reused_dates:
+                        STAGE_CACHE_HITS.inc(len(plan.reused_dates), stage='llm')
+                    logger.info(f"{url}: {len(plan.changed_sections)} new/changed section(s), {len(plan.reused_dates)} unchanged")
+                    timing['sections_changed'] = len(plan.changed_sections)
+                    timing['sections_reused'] = len(plan.reused_dates)
+                    for digest, section in plan.changed_sections:
+                        job.section_of[len(job.sources)] = (url, digest)
+                        job.sources.append(ExtractionSource(source_id=len(job.sources), artist_name=artist.name,
+                                                            url=url, content=section))
+                else:
+                    # Scrape failed or returned no content, add specific error from scrape_url
+                    error_msg = scraped_result.get("error", "Unknown scraping error")
+                    logger.warning(f"Failed to get usable content from {url} for {artist.name}: {error_msg}")
+                    if not scraped_result.get("disabled") and not scraped_result.get("deadline"):
+                        # A disabled source is reported once, by the "source disabled" alert, and a missed
+                        # deadline once for the whole check
+                        job.error_messages.append(f"• {url}: {error_msg}")
+                    timing['error'] = error_msg
+
+            except Exception as e:
+                # Catch exceptions while preparing this URL for extraction
+                error_msg = f"Error processing {url}: {str(e)}"
+                logger.error(f"{error_msg} for {artist.name}")
+                job.error_messages.append(f"• {url}: {str(e)}")
+                timing['error'] = str(e)
 
-                    except Exception as e:
-                        # Catch exceptions during scraping OR LLM processing for this URL
-                        error_msg = f"Error processing {url}: {str(e)}"
-                        logger.error(f"{error_msg} for {artist.name}")
-                        scrape_error_messages.append(f"• {url}: {str(e)}")
+    def extract_dates(self, job: 'CheckJob'):
+        """Extract stage: sends the changed sections to the LLM in as few requests as the token budget allows.
+
+        A page with more changed content than LLM_MAP_REDUCE_THRESHOLD tokens is extracted on its own,
+        map-reduce style: in overlapping chunks sent concurrently, whose dates are merged per section.
+        """
+        artist = job.artist
+        job.new_dates = {url: {} for url in job.plans} # url -> {section hash: dates}
+        pages: Dict[str, List[ExtractionSource]] = {}
+        for source in job.sources:
+            pages.setdefault(source.url, []).append(source)
+        large = [url for url, sources in pages.items() if is_large_page(sources)]
+
+        for batch in pack_batches([source for source in job.sources if source.url not in large]):
+            logger.info(f"Sending {len(batch)} changed section(s) to LLM for {artist.name}...")
+            outcome = self.extract_batch(batch, job.deadline)
+            self._record_extraction(job, batch, outcome)
+            self._attribute_llm_cost(job, batch, outcome.seconds, outcome.prompt_bytes)
+
+        for url in large:
+            sources = pages[url]
+            start = time.perf_counter()
+            chunks, outcomes = self.extract_chunks(sources, job.deadline)
+            logger.info(f"Extracted {len(sources)} changed section(s) of {url} for {artist.name} in {len(chunks)} "
+                        f"overlapping chunk(s), {sum(1 for outcome in outcomes if outcome.results is None)} failed")
+            # Reduce: sections in two chunks get the union of both extractions
+            extracted = {source.source_id: source for chunk, outcome in zip(chunks, outcomes)
+                         if outcome.results is not None for source in chunk}
+            merged = merge_results(outcome.results for outcome in outcomes if outcome.results is not None)
+            self._record_extraction(job, list(extracted.values()), BatchOutcome(results=merged))
+            for chunk, outcome in zip(chunks, outcomes):
+                if outcome.results is None:
+                    self._record_extraction(job, chunk, outcome)
+            # Chunks run concurrently, so the page's LLM time is the wall time of the whole map step
+            self._attribute_llm_cost(job, sources, time.perf_counter() - start,
+                                     sum(outcome.prompt_bytes for outcome in outcomes))
+
+    def _record_extraction(self, job: 'CheckJob', batch: List[ExtractionSource], outcome: BatchOutcome):
+        """Stores the dates of an extraction request, or marks its pages failed so their snapshots stay put."""
+        artist = job.artist
+        if outcome.results is not None:
+            for source in batch:
+                url, digest = job.section_of[source.source_id]
+                job.new_dates[url][digest] = outcome.results.get(source.source_id, [])
+        elif isinstance(outcome.error, (SourceDisabled, DeadlineExceeded)):
+            # Not reported per URL: a disabled Gemini has its own alert and a missed deadline is reported for
+            # the whole check. The snapshots stay put so the sections are extracted by a later run
+            logger.warning(f"Skipping LLM extraction for {artist.name}: {outcome.error}")
+            for source in batch:
+                job.failed_urls.add(source.url)
+                job.timings[source.url]['error'] = str(outcome.error)
+        else:
+            # Every URL in the batch is affected
+            logger.error(f"Error processing LLM batch for {artist.name}: {outcome.error}", exc_info=outcome.error)
+            for url in dict.fromkeys(source.url for source in batch):
+                if url not in job.failed_urls:
+                    job.failed_urls.add(url)
+                    job.error_messages.append(f"• {url}: LLM Processing Failed - {outcome.error}")
+                    job.timings[url]['error'] = f"LLM Processing Failed - {outcome.error}"
+
+    def _attribute_llm_cost(self, job: 'CheckJob', batch: List[ExtractionSource], seconds: float, prompt_bytes: int):
+        """Adds a request's time and prompt bytes to the check, split between its pages by content size."""
+        record = job.record
+        if record is not None:
+            record.llm_seconds = (record.llm_seconds or 0.0) + seconds
+            record.llm_bytes_sent = (record.llm_bytes_sent or 0) + prompt_bytes
+        total_chars = sum(len(source.content) for source in batch) or 1
+        for source in batch:
+            share = len(source.content) / total_chars
+            job.timings[source.url]['llm_seconds'] += seconds * share
+            job.timings[source.url]['llm_bytes_sent'] += int(prompt_bytes * share)
+
+    def finalize_check(self, job: 'CheckJob'):
+        """Dedupe stage: merges all results, saves the page snapshots and updates the artist. Writes to the database."""
+        artist, record = job.artist, job.record
+
+        # Merge fresh results with dates carried over from unchanged sections, then keep the
+        # ones near the artist's locations (snapshots store every date, so this is done here)
+        matcher = LocationMatcher(job.cities, self.match_radius_km) if job.plans else None
+        for url, plan in job.plans.items():
+            llm_dates = [TourDate.from_dict(date, source='Web Scrape/LLM', source_url=url)
+                         for date in merged_dates(plan, job.new_dates.get(url, {})) if matcher.matches(date.get('city'))]
+            logger.info(f"LLM processing complete for {artist.name}. Found {len(llm_dates)} dates from {url}")
+            job.found_dates.extend(llm_dates)
+            job.timings[url]['dates_found'] = len(llm_dates)
+            if url not in job.failed_urls:
+                # Only advance the snapshot when every changed section was extracted
+                save_snapshot(artist.id, plan, job.new_dates.get(url, {}))
+
+        if record is not None:
+            for url in job.urls:
+                record.add_source_timing(**job.timings[url])
+
+        if job.deadline is not None and job.deadline.missed:
+            logger.warning(f"Check of {artist.name} cut short: {job.deadline.missed}")
+            job.error_messages.append(f"• {job.deadline.missed}; the remaining sources are checked again next run")
 
         # --- Add Error Notification Block ---
-        if scrape_error_messages:
-            logger.warning(f"Encountered {len(scrape_error_messages)} errors while checking sources for {artist.name}.")
-            error_notification = f"⚠️ <b>Problems checking sources for {artist.name}:</b>\n\n"
-            error_notification += "\n".join(scrape_error_messages)
-            # Send the error notification immediately
-            notifier.send_message(error_notification)
+        if job.error_messages:
+            logger.warning(f"Encountered {len(job.error_messages)} errors while checking sources for {artist.name}.")
+            job.error_notification = f"⚠️ <b>Problems checking sources for {artist.name}:</b>\n\n"
+            job.error_notification += "\n".join(job.error_messages)
         # --- End Error Notification Block ---
 
         # 3. De-duplicate combined results
         # Use a more robust key for deduplication: (artist, lowercase venue, date, lowercase city)
-        unique_dates = []
         seen_events = set()
-        for date in all_found_dates:
-            # Normalize key components
-            venue_key = date.get('venue', 'N/A').lower()
-            date_key = date.get('date', 'N/A') # Assume date format is consistent for duplicates
-            city_key = date.get('city', 'N/A').lower()
-            artist_key = date.get('artist', 'N/A').lower()
-            
-            event_key = (artist_key, venue_key, date_key, city_key)
-            
+        for date in job.found_dates:
+            event_key = date.key() # Assume date format is consistent for duplicates
             if event_key not in seen_events:
-                unique_dates.append(date)
+                job.unique_dates.append(date)
                 seen_events.add(event_key)
             else:
                 logger.debug(f"Duplicate event skipped: {event_key}")
 
+        if record is not None:
+            record.dates_found = len(job.unique_dates)
+            record.errors = len(job.error_messages)
+
         # Update last_checked timestamp
         try:
-            # Ensure the timezone object is available
-            vancouver_tz = pytz.timezone('America/Vancouver')
-            artist.last_checked = datetime.now(vancouver_tz)
+            # Load the artist in this thread's session; pipeline jobs only carry a detached ArtistSpec
+            db_artist = db.session.get(Artist, artist.id)
+            if db_artist is not None:
+                db_artist.last_checked = datetime.now(vancouver_tz)
             db.session.commit()
             logger.info(f"Updated last_checked for {artist.name}")
-        except NameError:
-             logger.error("Timezone 'America/Vancouver' not defined (ensure pytz is imported and installed). Cannot set last_checked.")
         except Exception as e:
             logger.error(f"Failed to update last_checked for {artist.name}: {e}")
             db.session.rollback() # Rollback if commit fails
 
-
-        logger.info(f"Check complete for {artist.name}. Found {len(unique_dates)} unique total tour dates after deduplication.")
-
-        # Return only the unique dates found. Errors are handled via notification.
-        return unique_dates
-
-def check_all_artists():
+        logger.info(f"Check complete for {artist.name}. Found {len(job.unique_dates)} unique total tour dates after deduplication.")
+
+
+# Worker counts per pipeline stage, and how many artists may wait between two stages
+PIPELINE_FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', '4'))
+PIPELINE_EXTRACT_WORKERS = int(os.getenv('PIPELINE_EXTRACT_WORKERS', '2'))
+PIPELINE_NOTIFY_WORKERS = int(os.getenv('PIPELINE_NOTIFY_WORKERS', '1'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '8'))
+
+
+@dataclass
+class ArtistSpec:
+    """Plain copy of an Artist row that can be handed between pipeline threads."""
+    id: int
+    name: str
+    cities: str
+    urls: Optional[str]
+    use_ticketmaster: bool
+    on_hold: bool
+    artist_type: Optional[str] = None
+    last_checked: Optional[datetime] = None
+
+    @classmethod
+    def from_artist(cls, artist: Artist) -> 'ArtistSpec':
+        return cls(id=artist.id, name=artist.name, cities=artist.cities or '', urls=artist.urls,
+                   use_ticketmaster=bool(artist.use_ticketmaster), on_hold=bool(artist.on_hold),
+                   artist_type=artist.artist_type, last_checked=artist.last_checked)
+
+
+@dataclass
+class CheckJob:
+    """One artist's check as it moves through the fetch, extract, dedupe and notify stages."""
+    artist: object  # Artist, or ArtistSpec inside the pipeline
+    record: object = None  # ArtistCheck, or CheckStats inside the pipeline
+    record_id: Optional[int] = None
+    cities: List[str] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    found_dates: List[TourDate] = field(default_factory=list)
+    error_messages: List[str] = field(default_factory=list)
+    timings: Dict[str, Dict] = field(default_factory=dict)
+    plans: Dict = field(default_factory=dict)  # url -> ExtractionPlan
+    sources: List[ExtractionSource] = field(default_factory=list)
+    section_of: Dict[int, tuple] = field(default_factory=dict)  # source_id -> (url, section hash)
+    new_dates: Dict[str, Dict] = field(default_factory=dict)
+    failed_urls: set = field(default_factory=set)
+    unique_dates: List[TourDate] = field(default_factory=list)
+    error_notification: Optional[str] = None
+    failure: Optional[str] = None
+    cancelled: bool = False  # Not started before shutdown; left for the resumed run
+    deadline: Optional[Deadline] = None
+    started: bool = False  # False if the run's deadline passed while the artist was queued
+
+
+@instrumented('check_all')
+def check_all_artists(trigger: str = 'scheduled', profile: Optional[bool] = None):
+    """Checks every active artist. `profile` overrides the profiling setting for this run."""
     with app.app_context(): # Ensure we are within app context for DB access
-        logger.info("Starting scheduled check for all artists...")
-        # Instantiate notifier and scraper once
-        notifier = TelegramNotifier()
-        scraper = TourScraper()
+        _run_check_all(trigger, profile)
 
-        try:
-            artists = Artist.query.filter_by(on_hold=False).all()
-            if not artists:
-                logger.info("No active artists found to check.")
-                return
+def resume_interrupted_run(profile: Optional[bool] = None) -> bool:
+    """Continues the check run that a restart interrupted, skipping the artists it already finished.
 
+    Returns False if there was nothing to resume.
+    """
+    with app.app_context():
+        resume = run_to_resume()
+        if resume is None:
+            return False
+        run, artist_ids = resume
+        logger.info(f"Resuming check run {run.id} ({run.trigger}) with {len(artist_ids)} artist(s) left")
+        _run_check_all(run.trigger, profile, run, artist_ids)
+        return True
+
+def _run_check_all(trigger: str, profile: Optional[bool], run=None, artist_ids: Optional[List[int]] = None):
+    settings = cached_settings()
+    profiling = settings.profiling_enabled if profile is None else profile
+    # Registered as running so a graceful shutdown waits for the in-flight artists
+    with run_in_progress(), maybe_profile(profiling, f"check_all_{trigger}", settings.profile_retention) as session:
+        _check_all_artists(trigger, session, run, artist_ids)
+
+def _check_all_artists(trigger: str, profile_session: Optional[ProfileSession] = None, run=None,
+                       artist_ids: Optional[List[int]] = None):
+    """Runs (or, given `run` and the `artist_ids` it has left, resumes) a check of all active artists."""
+    logger.info("Starting scheduled check for all artists...")
+    # Instantiate notifier and scraper once
+    notifier = TelegramNotifier()
+    scraper = TourScraper()
+    run = run or start_run(trigger)
+    run_status = 'completed'
+    interrupted = False
+
+    try:
+        artists = [ArtistSpec.from_artist(artist) for artist in Artist.query.filter_by(on_hold=False).all()]
+        finished_ids = []
+        if artist_ids is not None:
+            # Resumed run: only the artists it hadn't finished (deleted or paused ones are dropped)
+            remaining = set(artist_ids)
+            finished_ids = [artist_id for artist_id in json.loads(run.artist_ids or '[]') if artist_id not in remaining]
+            artists = [artist for artist in artists if artist.id in remaining]
+        if not artists:
+            logger.info("No active artists found to check.")
+        else:
             logger.info(f"Found {len(artists)} active artists to check.")
+            artists, deferred = plan_run(artists, scraper)
+            run.artists_deferred = (run.artists_deferred or 0) + len(deferred)
+            if deferred:
+                logger.warning(f"Deferred {len(deferred)} artist(s) to stay within today's API budgets: "
+                               f"{', '.join(artist.name for artist in deferred)}")
+            # The plan is the run's checkpoint: after a restart, the artists in it that weren't finished are checked
+            run.artist_ids = json.dumps(finished_ids + [artist.id for artist in artists])
+            db.session.commit()
 
-            for artist in artists:
+            # Start scraping every unique URL of the run right away; fetch workers pick the pages up as they land
+            run_urls = [url for artist in artists for url in artist_urls(artist)]
+            if run_urls:
+                logger.info(f"Prefetching {len(set(map(normalize_url, run_urls)))} unique URL(s) for {len(artists)} artists")
+                prefetch_start = time.perf_counter()
+                scraper.prefetch_urls(run_urls, wait=False)
+
+            # Artists still queued when the run's deadline passes are recorded as timed out without being checked
+            run_deadline = Deadline(RUN_DEADLINE_SECONDS, 'run')
+            with _check_pipeline(scraper, notifier, run.id, run_deadline, profile_session) as pipeline:
+                for index, artist in enumerate(artists):
+                    if shutdown_requested():
+                        logger.warning(f"Shutting down: {len(artists) - index} artist(s) left for when the run resumes")
+                        break
+                    # The producer blocks here while the fetch queue is full
+                    record = start_artist_check(run, artist)
+                    pipeline.submit(CheckJob(artist=artist, record=CheckStats(), record_id=record.id))
+
+            if run_urls and scraper.last_scrape_finished:
+                run.prefetch_seconds = max(scraper.last_scrape_finished - prefetch_start, 0.0)
+
+            if run_deadline.missed:
+                run_status = 'timeout'
+                timed_out = ArtistCheck.query.filter_by(run_id=run.id, status='timeout').count()
+                logger.warning(f"Check run {run.id} reached {run_deadline.describe()}; {timed_out} artist(s) timed out")
+                notifier.send_message(f"⏱️ <b>Check run cut short</b> by {run_deadline.describe()}.\n\n"
+                                      f"{timed_out} artist(s) weren't fully checked; they are checked again in the next run.",
+                                      f"run{run.id}:deadline")
+
+            if shutdown_requested():
+                finished = {artist_id for (artist_id,) in db.session.query(ArtistCheck.artist_id).filter(
+                    ArtistCheck.run_id == run.id, ArtistCheck.checkpointed_at.isnot(None))}
+                interrupted = any(artist.id not in finished for artist in artists)
+
+    except Exception as e:
+        # Catch errors related to fetching artists or general setup
+        STAGE_ERRORS.inc(stage='check_all')
+        run_status = 'failed'
+        logger.error(f"❌ Failed to run scheduled check: {e}", exc_info=True)
+        db.session.rollback()
+        notifier.send_message(f"❌ Failed to run scheduled artist check. Error: {e}", f"run{run.id}:failed")
+    finally:
+        scraper.close()
+
+    try:
+        if interrupted and run_status in ('completed', 'timeout'):
+            interrupt_run(run)
+            logger.info(f"Check run {run.id} interrupted by shutdown; it will resume after restart.")
+            return
+        finish_run(run, run_status)
+    except Exception as e:
+        logger.error(f"Failed to record check run {run.id}: {e}")
+    logger.info("Scheduled check for all artists completed.")
+
+def plan_run(artists: List[ArtistSpec], scraper: TourScraper) -> Tuple[List[ArtistSpec], List[ArtistSpec]]:
+    """Orders the run's artists by value and defers those that would exceed today's API budgets."""
+    yields = recent_yield([artist.id for artist in artists])
+    now = datetime.now(vancouver_tz).replace(tzinfo=None)
+    return plan_checks(artists, lambda artist: check_value(artist.last_checked, yields.get(artist.id, 0.0), now),
+                       scraper.estimate_usage, remaining_budgets())
+
+def _check_pipeline(scraper: TourScraper, notifier: TelegramNotifier, run_id: int, run_deadline: Deadline,
+                    profile_session: Optional[ProfileSession] = None) -> Pipeline:
+    """Builds the fetch -> extract -> dedupe -> notify pipeline for one run of check_all_artists.
+
+    Only the single dedupe worker writes check results to the database; the other stages only
+    call external services and make short writes to their own caches (e.g. Ticketmaster sync state).
+    Each artist gets ARTIST_DEADLINE_SECONDS from the moment it is fetched, within `run_deadline`.
+    """
+    def guarded(stage_name, func):
+        def run_stage(job: CheckJob):
+            if job.failure is None and not job.cancelled:
                 try:
-                    # Pass the notifier instance here
-                    tour_dates = scraper.check_artist(artist, notifier)
-
-                    if tour_dates:
-                        logger.info(f"Sending success notification for {len(tour_dates)} dates for {artist.name}")
-                        if not notifier.send_tour_dates(artist.name, tour_dates):
-                            logger.error(f"Failed to send success notification for {artist.name}")
-                    else:
-                        logger.info(f"No new tour dates found for {artist.name} during this check.")
-
+                    func(job)
                 except Exception as e:
                     # Catch errors during the check for a *specific* artist
-                    logger.error(f"❌ Unexpected error checking artist {artist.name}: {e}", exc_info=True)
-                    # Send a specific error message for this artist check failure
-                    notifier.send_message(f"❌ Failed to complete check for artist {artist.name}. Error: {e}")
-
-        except Exception as e:
-            # Catch errors related to fetching artists or general setup
-            logger.error(f"❌ Failed to run scheduled check: {e}", exc_info=True)
-            notifier.send_message(f"❌ Failed to run scheduled artist check. Error: {e}")
-
-        logger.info("Scheduled check for all artists completed.") 
\ No newline at end of file
+                    STAGE_ERRORS.inc(stage='check_all')
+                    logger.error(f"❌ Unexpected error checking artist {job.artist.name} ({stage_name}): {e}", exc_info=True)
+                    db.session.rollback()
+                    job.failure = str(e)
+            return job
+        return run_stage
+
+    def fetch(job: CheckJob):
+        if shutdown_requested():
+            # Only artists already in flight are finished on shutdown; the record stays open for the resumed run
+            job.cancelled = True
+            return
+        job.deadline = Deadline(ARTIST_DEADLINE_SECONDS, 'artist', run_deadline)
+        if job.deadline.overdue('while queued'):
+            logger.warning(f"Not checking {job.artist.name}: {job.deadline.missed}")
+            return
+        job.started = True
+        scraper.fetch_sources(job)
+
+    def record_result(job: CheckJob):
+        if job.failure is None and job.started:
+            scraper.finalize_check(job)
+        check = db.session.get(ArtistCheck, job.record_id)
+        if check is not None:
+            job.record.apply_to(check)
+            missed = job.deadline.missed if job.deadline is not None else None
+            status = 'failed' if job.failure else 'timeout' if missed else 'completed'
+            finish_artist_check(check, status, job.failure or missed)
+
+    def notify(job: CheckJob):
+        if job.cancelled:
+            return None
+        send_disabled_alerts(notifier)
+        if job.started:
+            queue_notifications(job)
+        # Checkpoint: the artist is done, a resumed run won't check it again
+        checkpoint_artist_check(job.record_id)
+        return None
+
+    def queue_notifications(job: CheckJob):
+        # Idempotency keys, so a check that is retried or resumed doesn't notify twice
+        key_prefix = f"run{run_id}:artist{job.artist.id}"
+        if job.failure is not None:
+            # Send a specific error message for this artist check failure
+            notifier.send_message(f"❌ Failed to complete check for artist {job.artist.name}. Error: {job.failure}",
+                                  f"{key_prefix}:failed")
+            return
+        if job.error_notification:
+            notifier.send_message(job.error_notification, f"{key_prefix}:errors")
+        STAGE_DATES_FOUND.inc(len(job.unique_dates), stage='check_all')
+        if job.unique_dates:
+            logger.info(f"Queueing success notification for {len(job.unique_dates)} dates for {job.artist.name}")
+            if not notifier.send_tour_dates(job.artist.name, job.unique_dates, f"{key_prefix}:dates"):
+                logger.error(f"Failed to queue success notification for {job.artist.name}")
+        else:
+            logger.info(f"No new tour dates found for {job.artist.name} during this check.")
+
+    @contextmanager
+    def worker_context():
+        # Every worker needs its own app context (and DB session), and its own profiler when profiling
+        with app.app_context(), ExitStack() as stack:
+            if profile_session is not None:
+                stack.enter_context(profile_session.profile_thread())
+            yield
+
+    stages = [
+        Stage('fetch', guarded('fetch', fetch), PIPELINE_FETCH_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage('extract', guarded('extract', scraper.extract_dates), PIPELINE_EXTRACT_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage('dedupe', guarded('dedupe', record_result), 1, PIPELINE_QUEUE_SIZE),
+        Stage('notify', notify, PIPELINE_NOTIFY_WORKERS, PIPELINE_QUEUE_SIZE),
+    ]
+    return Pipeline(stages, worker_context)
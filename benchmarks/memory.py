@@ -0,0 +1,133 @@
+"""Memory benchmark for Ticketmaster result handling.
+
+Builds large fixture pages shaped like Discovery API responses (a state-wide sweep: several
+pages of 200 events with the images, classifications, price ranges and venue details the API
+returns) and compares peak and retained memory, measured with tracemalloc, of:
+
+  full-json   every page loaded with json.loads and kept, one dict per date (the old behaviour)
+  compact     each page loaded with json.loads, reduced to compact events, TourDate per date
+  streaming   each page parsed incrementally with ijson into compact events, TourDate per date
+
+Usage:
+    python benchmarks/memory.py [--pages 5] [--events 200]
+"""
+import argparse
+import gc
+import io
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ticketmaster_sync import compact_event, stream_events  # noqa: E402
+from app.tour_date import TourDate  # noqa: E402
+
+
+def fixture_event(page: int, index: int) -> dict:
+    event_id = f"vvG1zZ{page:03d}{index:05d}"
+    venue = {
+        'name': f"Venue {index % 40}", 'type': 'venue', 'id': f"KovZpZA{index % 40:04d}", 'locale': 'en-us',
+        'postalCode': '90015', 'timezone': 'America/Los_Angeles',
+        'city': {'name': f"City {index % 25}"}, 'state': {'name': 'California', 'stateCode': 'CA'},
+        'country': {'name': 'United States Of America', 'countryCode': 'US'},
+        'address': {'line1': f"{index} Main Street"}, 'location': {'longitude': '-118.2', 'latitude': '34.0'},
+        'markets': [{'name': 'Los Angeles', 'id': '27'}], 'dmas': [{'id': 223}, {'id': 324}],
+        'images': [{'ratio': '16_9', 'url': f"https://s1.ticketm.net/dam/v/{index}/venue.jpg", 'width': 2048, 'height': 1152}],
+        'upcomingEvents': {'_total': 40, 'ticketmaster': 40}, '_links': {'self': {'href': f"/discovery/v2/venues/{index}"}},
+    }
+    return {
+        'name': f"Artist {index % 7} Live", 'type': 'event', 'id': event_id, 'test': False,
+        'url': f"https://www.ticketmaster.com/event/{event_id}", 'locale': 'en-us',
+        'images': [{'ratio': ratio, 'url': f"https://s1.ticketm.net/dam/a/{event_id}_{ratio}_{width}.jpg",
+                    'width': width, 'height': width // 2, 'fallback': False}
+                   for ratio in ('16_9', '3_2', '4_3') for width in (640, 1024, 2048)],
+        'sales': {'public': {'startDateTime': '2026-01-01T18:00:00Z', 'startTBD': False, 'endDateTime': '2026-06-01T03:00:00Z'},
+                  'presales': [{'startDateTime': '2025-12-30T15:00:00Z', 'endDateTime': '2025-12-31T05:00:00Z',
+                                'name': f"Presale {n}"} for n in range(3)]},
+        'dates': {'start': {'localDate': f"2026-{(index % 12) + 1:02d}-{(index % 28) + 1:02d}", 'localTime': '20:00:00',
+                            'dateTime': f"2026-{(index % 12) + 1:02d}-{(index % 28) + 1:02d}T03:00:00Z",
+                            'dateTBD': False, 'timeTBA': False, 'noSpecificTime': False},
+                  'timezone': 'America/Los_Angeles', 'status': {'code': 'onsale'}, 'spanMultipleDays': False},
+        'classifications': [{'primary': True, 'segment': {'id': 'KZFzniwnSyZfZ7v7nJ', 'name': 'Music'},
+                             'genre': {'id': 'KnvZfZ7vAeA', 'name': 'Rock'}, 'subGenre': {'id': 'KZazBEonSMnZfZ7v6F1', 'name': 'Pop'}}],
+        'promoter': {'id': '494', 'name': 'PROMOTED BY VENUE'},
+        'priceRanges': [{'type': 'standard', 'currency': 'USD', 'min': 39.5, 'max': 129.5}],
+        'seatmap': {'staticUrl': f"https://maps.ticketmaster.com/maps/geometry/3/event/{event_id}/staticImage"},
+        'ticketLimit': {'info': 'There is an 8 ticket limit for this event.'},
+        'pleaseNote': 'No cameras or recording devices. ' * 4,
+        '_links': {'self': {'href': f"/discovery/v2/events/{event_id}"}},
+        '_embedded': {
+            'venues': [venue],
+            'attractions': [{'name': f"Artist {index % 7}", 'type': 'attraction', 'id': f"K8vZ91{index % 7}",
+                             'url': f"https://www.ticketmaster.com/artist/{index % 7}",
+                             'images': [{'ratio': '16_9', 'url': f"https://s1.ticketm.net/dam/a/{index % 7}.jpg"}]},
+                            {'name': 'Opening Act', 'type': 'attraction', 'id': 'K8vZ9171oZ7'}],
+        },
+    }
+
+
+def fixture_pages(pages: int, events: int) -> list:
+    return [json.dumps({
+        '_embedded': {'events': [fixture_event(page, index) for index in range(events)]},
+        '_links': {'self': {'href': f"/discovery/v2/events.json?page={page}"}},
+        'page': {'size': events, 'totalElements': pages * events, 'totalPages': pages, 'number': page},
+    }).encode('utf-8') for page in range(pages)]
+
+
+def full_json(pages):
+    events = []
+    for raw in pages:
+        events.extend(json.loads(raw)['_embedded']['events'])
+    return events, [{'artist': 'Artist 1', 'city': e['_embedded']['venues'][0]['city']['name'],
+                     'venue': e['_embedded']['venues'][0]['name'], 'date': e['dates']['start']['localDate'],
+                     'ticket_url': e['url'], 'source': 'Ticketmaster', 'source_url': e['url']} for e in events]
+
+
+def to_tour_dates(events):
+    return [TourDate(artist='Artist 1', city=e['city'], venue=e['venue'], date=e['local_date'],
+                     ticket_url=e['url'], source='Ticketmaster', source_url=e['url']) for e in events]
+
+
+def compact(pages):
+    events = []
+    for raw in pages:
+        events.extend(compact_event(event) for event in json.loads(raw)['_embedded']['events'])
+    return events, to_tour_dates(events)
+
+
+def streaming(pages):
+    events = []
+    for raw in pages:
+        page_events, _ = stream_events(io.BytesIO(raw))
+        events.extend(page_events)
+    return events, to_tour_dates(events)
+
+
+def measure(func, pages):
+    gc.collect()
+    tracemalloc.start()
+    result = func(pages)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    pages = fixture_pages(args.pages, args.events)
+    print(f"{args.pages} pages x {args.events} events, {sum(map(len, pages)) / 1024 / 1024:.1f} MB of JSON")
+    assert compact(pages)[0] == streaming(pages)[0], "streaming and json parsers disagree"
+    for name, func in (('full-json', full_json), ('compact', compact), ('streaming', streaming)):
+        peak, retained = measure(func, pages)
+        print(f"{name:>10}: peak {peak / 1024 / 1024:7.2f} MB, retained {retained / 1024 / 1024:7.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
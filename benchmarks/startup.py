@@ -0,0 +1,71 @@
+"""Startup-time benchmark.
+
+Measures, in fresh interpreters, how long `import app` takes (what every web worker pays before
+serving the dashboard) and whether the heavy SDKs were imported, then how long building a
+TourScraper and resolving its clients takes the first time and on later (cached) calls.
+
+Usage:
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('google.generativeai', 'firecrawl')
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({'import_seconds': elapsed, 'heavy': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+SCRAPER_PROBE = """
+import json, os, time
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+os.environ.setdefault('FIRECRAWL_API_KEY', 'benchmark')
+os.environ.setdefault('TICKETMASTER_API_KEY', 'benchmark')
+from app import app
+from app.utils import TourScraper
+timings = []
+with app.app_context():
+    for _ in range(3):
+        start = time.perf_counter()
+        scraper = TourScraper()
+        scraper.model, scraper.firecrawl, scraper.ticketmaster
+        timings.append(time.perf_counter() - start)
+print(json.dumps({'scraper_seconds': timings}))
+"""
+
+
+def run_probe(code: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [run_probe(IMPORT_PROBE) for _ in range(args.runs)]
+    import_times = [probe['import_seconds'] for probe in imports]
+    print(f"import app: median {statistics.median(import_times) * 1000:.0f} ms, "
+          f"min {min(import_times) * 1000:.0f} ms over {args.runs} runs")
+    print(f"heavy SDKs imported at startup: {', '.join(imports[0]['heavy']) or 'none'}")
+
+    scraper = run_probe(SCRAPER_PROBE)['scraper_seconds']
+    print(f"TourScraper + clients: first {scraper[0] * 1000:.0f} ms, "
+          f"then {', '.join(f'{t * 1000:.2f} ms' for t in scraper[1:])} (from the client registry)")
+
+
+if __name__ == '__main__':
+    main()
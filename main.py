@@ -1,11 +1,12 @@
 from app import app, db
-from app.models import Artist, Settings
-from app.utils import check_all_artists
+from app.models import Artist
+from app.cache import cached_settings
+from app.utils import check_all_artists, resume_interrupted_run, TelegramNotifier
+from app.outbox import OutboxSender
+from app.shutdown import install_signal_handlers, request_shutdown, shutdown_requested, wait, wait_until_idle
 import schedule
-import time
 import logging
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 
 # Configure logging
@@ -18,7 +19,7 @@ logger = logging.getLogger(__name__)
 
 def schedule_checks():
     with app.app_context():
-        settings = Settings.get_settings()
+        settings = cached_settings()
         times = [t.strip() for t in settings.check_frequency.split(',')]
         
         # Clear existing schedule
@@ -32,15 +33,21 @@ def schedule_checks():
 def run_scheduler():
     logger.info("Starting scheduler...")
     schedule_checks()
-    
-    while True:
+
+    # Finish a run that was cut short by the last restart before waiting for the next scheduled one
+    try:
+        resume_interrupted_run()
+    except Exception as e:
+        logger.error(f"Error resuming interrupted check run: {str(e)}")
+
+    while not shutdown_requested():
         try:
             with app.app_context():
                 schedule.run_pending()
-            time.sleep(60)
+            wait(60)
         except Exception as e:
             logger.error(f"Error in scheduler: {str(e)}")
-            time.sleep(60)
+            wait(60)
 
 if __name__ == "__main__":
     # Load environment variables
@@ -50,12 +57,25 @@ if __name__ == "__main__":
     with app.app_context():
         db.create_all()
     
-    # Start the scheduler only in the main process (not in Flask reloader)
-    if not os.environ.get('WERKZEUG_RUN_MAIN'):
-        import threading
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
-        logger.info("Scheduler started in main process")
+    install_signal_handlers()
+
+    # The scheduler and the outbox sender run in the same process as the web server, so /metrics and
+    # /api/pipeline see scheduled runs too
+    import threading
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+    logger.info("Scheduler started in main process")
+
+    # Deliver queued Telegram messages in the background, including any left over from before a restart
+    OutboxSender(TelegramNotifier().deliver).start()
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Run the Flask app. Without the reloader: it would serve requests from a child process, whose
+    # in-memory metrics and pipeline status never see the scheduler's work
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    finally:
+        # SIGTERM ends app.run with SystemExit: stop starting artists and let running checks finish the
+        # in-flight ones. Anything left is resumed on the next start.
+        request_shutdown()
+        if not wait_until_idle():
+            logger.warning("Exiting with a check still running; it will resume on the next start")
\ No newline at end of file
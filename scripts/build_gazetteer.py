@@ -0,0 +1,46 @@
+"""Builds app/geodata/gazetteer.tsv.gz from a GeoNames cities dump.
+
+Usage:
+    curl -O https://download.geonames.org/export/dump/cities1000.zip && unzip cities1000.zip
+    python scripts/build_gazetteer.py cities1000.txt
+
+Only populated places in COUNTRIES are kept. Canadian provinces are stored as their
+postal abbreviations (GeoNames uses numeric admin1 codes for Canada).
+GeoNames data is licensed under CC BY 4.0 (https://www.geonames.org/).
+"""
+import gzip
+import sys
+from pathlib import Path
+
+COUNTRIES = {'US', 'CA'}
+CANADIAN_PROVINCES = {
+    '01': 'AB', '02': 'BC', '03': 'MB', '04': 'NB', '05': 'NL', '07': 'NS', '08': 'ON',
+    '09': 'PE', '10': 'QC', '11': 'SK', '12': 'YT', '13': 'NT', '14': 'NU',
+}
+OUTPUT = Path(__file__).resolve().parent.parent / 'app' / 'geodata' / 'gazetteer.tsv.gz'
+
+
+def region_code(country: str, admin1: str) -> str:
+    return CANADIAN_PROVINCES.get(admin1, admin1) if country == 'CA' else admin1
+
+
+def main(source: str):
+    rows = []
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            name, lat, lon, country, admin1, population = fields[1], fields[4], fields[5], fields[8], fields[10], fields[14]
+            if country not in COUNTRIES:
+                continue
+            rows.append((name, country, region_code(country, admin1), float(lat), float(lon), int(population or 0)))
+
+    rows.sort(key=lambda row: -row[5])
+    lines = ['# name\tcountry\tregion\tlatitude\tlongitude\tpopulation (GeoNames, CC BY 4.0)']
+    lines += [f"{name}\t{country}\t{region}\t{lat:.4f}\t{lon:.4f}\t{population}"
+              for name, country, region, lat, lon, population in rows]
+    OUTPUT.write_bytes(gzip.compress('\n'.join(lines).encode('utf-8'), 9))
+    print(f"Wrote {len(rows)} places to {OUTPUT}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -1,9 +1,27 @@
 import sqlite3
 import os
 
+# Columns added to existing tables after their initial release: (table, column, column definition).
+# New tables are created by db.create_all() on startup and don't need to be listed here.
+COLUMNS = [
+    ('artist', 'artist_type', "VARCHAR(20) DEFAULT 'music'"),
+    ('settings', 'profiling_enabled', "BOOLEAN DEFAULT 0"),
+    ('settings', 'profile_retention', "INTEGER DEFAULT 20"),
+    ('check_run', 'prefetch_seconds', "FLOAT"),
+    ('settings', 'match_radius_km', "INTEGER DEFAULT 50"),
+    ('settings', 'ticketmaster_daily_budget', "INTEGER DEFAULT 5000"),
+    ('settings', 'firecrawl_daily_budget', "INTEGER"),
+    ('settings', 'gemini_daily_token_budget', "INTEGER"),
+    ('check_run', 'artists_deferred', "INTEGER DEFAULT 0"),
+    ('check_run', 'artist_ids', "TEXT"),
+    ('check_run', 'resume_count', "INTEGER DEFAULT 0"),
+    ('artist_check', 'checkpointed_at', "DATETIME"),
+    ('check_run', 'timeouts', "INTEGER DEFAULT 0"),
+]
+
 def run_migration():
     """
-    Simple script to migrate database schema by adding artist_type column
+    Simple script to migrate database schema by adding any missing columns from COLUMNS
     This doesn't require Flask or SQLAlchemy imports
     """
     # Look for database in multiple possible locations
@@ -35,18 +53,21 @@ def run_migration():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
-        # Check if the artist_type column already exists
-        cursor.execute("PRAGMA table_info(artist)")
-        columns = cursor.fetchall()
-        column_names = [column[1] for column in columns]
-        
-        if 'artist_type' not in column_names:
-            print("Adding 'artist_type' column to the Artist table...")
-            cursor.execute("ALTER TABLE artist ADD COLUMN artist_type VARCHAR(20) DEFAULT 'music'")
-            conn.commit()
-            print("Migration successful!")
-        else:
-            print("Column 'artist_type' already exists. No migration needed.")
+        for table, column, definition in COLUMNS:
+            # Check if the column already exists
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = cursor.fetchall()
+            column_names = [col[1] for col in columns]
+
+            if not column_names:
+                print(f"Table '{table}' does not exist yet. It will be created on startup.")
+            elif column not in column_names:
+                print(f"Adding '{column}' column to the {table} table...")
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                conn.commit()
+                print("Migration successful!")
+            else:
+                print(f"Column '{column}' already exists. No migration needed.")
         
         conn.close()
     except Exception as e:
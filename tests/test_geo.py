@@ -0,0 +1,39 @@
+from app.geo import LocationMatcher, split_city, split_tracked
+
+
+def test_split_city_reads_regions_and_countries():
+    assert split_city('Vancouver, BC, Canada').region == 'BC'
+    assert split_city('Portland, Oregon').region == 'OR'
+    assert split_city('London, England').country == 'GB'
+    assert split_city('London, UK').foreign
+    assert not split_city('Seattle, WA').foreign
+    assert split_tracked('Vancouver BC').region == 'BC'
+    assert split_tracked('London UK').country == 'GB'
+    assert split_tracked('New York').qualifier is None
+
+
+def test_tracked_international_city_matches_by_name_and_country():
+    matcher = LocationMatcher(['London UK'])
+    assert matcher.matches('London, UK')
+    assert matcher.matches('London, England')
+    assert not matcher.matches('London, ON')
+    assert not matcher.matches('London')
+    assert not matcher.matches('Paris, France')
+
+
+def test_bare_tracked_name_is_matched_by_name_only():
+    matcher = LocationMatcher(['Berlin'])
+    assert matcher.matches('Berlin, Germany')
+    assert matcher.matches('Berlin, NH')
+    # Not resolved to Berlin, NH, so its neighbours don't match
+    assert not matcher.matches('Gorham, NH')
+    assert matcher.tracked[0].place is None
+
+
+def test_qualified_city_matches_within_radius():
+    matcher = LocationMatcher(['Vancouver BC'], radius_km=50)
+    assert matcher.tracked[0].place is not None
+    assert matcher.matches('Burnaby, BC')
+    assert matcher.matches('Burnaby')
+    assert not matcher.matches('Toronto, ON')
+    assert not matcher.matches('Vancouver, France')
@@ -0,0 +1,75 @@
+import requests
+
+import app.utils as utils
+from app.breaker import BREAKER_FAILURE_THRESHOLD, FIRECRAWL_SOURCE
+
+
+class FakeBreakers:
+    """In-memory stand-in for the breaker table: failures per source, opened at the threshold."""
+
+    def __init__(self):
+        self.failures = {}
+
+    def allow(self, source):
+        return self.failures.get(source, 0) < BREAKER_FAILURE_THRESHOLD
+
+    def record_failure(self, source, error):
+        self.failures[source] = self.failures.get(source, 0) + 1
+        return self.failures[source] >= BREAKER_FAILURE_THRESHOLD
+
+    def record_success(self, source):
+        self.failures.pop(source, None)
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class Firecrawl:
+    def __init__(self, status_for_url):
+        self.status_for_url = status_for_url
+
+    def scrape_url(self, url, params=None):
+        status = self.status_for_url(url)
+        if status != 200:
+            raise requests.exceptions.HTTPError(f"Status code {status}", response=Response(status))
+        return {'markdown': f"Tour dates on {url}"}
+
+
+def scrape_runs(monkeypatch, firecrawl, urls, runs):
+    breakers = FakeBreakers()
+    monkeypatch.setenv('FIRECRAWL_API_KEY', 'key')
+    monkeypatch.setattr(utils, 'firecrawl_app', lambda api_key: firecrawl)
+    monkeypatch.setattr(utils, 'ensure_budget', lambda service: None)
+    monkeypatch.setattr(utils, 'record_usage', lambda *args, **kwargs: None)
+    for name in ('allow', 'record_failure', 'record_success'):
+        monkeypatch.setattr(utils, name, getattr(breakers, name))
+    results = None
+    for _ in range(runs):
+        scraper = utils.TourScraper(match_radius_km=50)
+        try:
+            results = scraper.prefetch_urls(urls)
+        finally:
+            scraper.close()
+    return breakers, results
+
+
+def test_failing_page_does_not_disable_firecrawl(monkeypatch):
+    urls = ['https://dead.example.com', 'https://a.example.com', 'https://b.example.com']
+    firecrawl = Firecrawl(lambda url: 500 if 'dead' in url else 200)
+    breakers, results = scrape_runs(monkeypatch, firecrawl, urls, runs=BREAKER_FAILURE_THRESHOLD + 1)
+
+    assert breakers.allow(FIRECRAWL_SOURCE)
+    assert not breakers.allow(utils.url_source(utils.normalize_url(urls[0])))
+    assert results[urls[0]]['disabled']
+    assert results[urls[1]]['success'] and results[urls[2]]['success']
+
+
+def test_firecrawl_outage_disables_firecrawl_not_pages(monkeypatch):
+    urls = ['https://a.example.com', 'https://b.example.com']
+    breakers, results = scrape_runs(monkeypatch, Firecrawl(lambda url: 402), urls, runs=BREAKER_FAILURE_THRESHOLD)
+
+    assert not breakers.allow(FIRECRAWL_SOURCE)
+    assert all(breakers.allow(utils.url_source(utils.normalize_url(url))) for url in urls)
+    assert all(result['disabled'] and result['skipped'] for result in results.values())
@@ -0,0 +1,13 @@
+from app.geo import LocationMatcher
+from app.utils import TicketmasterClient
+
+
+def test_location_queries_search_by_radius_only_for_resolved_cities(monkeypatch):
+    monkeypatch.setenv('TICKETMASTER_API_KEY', 'key')
+    matcher = LocationMatcher(['London', 'London UK', 'Vancouver BC', 'TX'])
+    queries = [params for params, _ in TicketmasterClient().location_queries(matcher, count_skipped=False)]
+    assert {'city': 'London'} in queries
+    assert {'city': 'London', 'countryCode': 'GB'} in queries
+    assert {'stateCode': 'TX'} in queries
+    radius = [params for params in queries if 'latlong' in params]
+    assert len(radius) == 1 and radius[0]['latlong'].startswith('49.')